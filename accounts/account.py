@@ -0,0 +1,71 @@
+from .models import UserProfile, UserRole
+from .roles import get_default_role_id, registry
+
+
+class Account:
+    """
+    The authenticated user with their profile and role, as exposed on
+    request.account by AccountMiddleware.
+    """
+    __slots__ = ('user', 'profile')
+
+    def __init__(self, user, profile):
+        self.user = user
+        self.profile = profile
+
+    @property
+    def is_authenticated(self):
+        return self.user.is_authenticated
+
+    @property
+    def role(self):
+        """RoleInfo from the process-wide registry, or None"""
+        if self.profile is None:
+            return None
+        return registry.get(self.profile.role_id)
+
+    @property
+    def role_name(self):
+        role = self.role
+        return role.role_name if role else 'user'
+
+    @property
+    def role_display(self):
+        return dict(UserRole.ROLE_CHOICES).get(self.role_name, 'Regular User')
+
+    @property
+    def is_admin(self):
+        return self.role_name == 'admin'
+
+    def has_role(self, role_name):
+        role = self.role
+        return role is not None and role.role_name == role_name
+
+    def has_permission(self, permission_name):
+        role = self.role
+        return role is not None and role.has_permission(permission_name)
+
+
+def load_account(request):
+    """
+    Build the Account for a request.
+
+    Users loaded by ResolvedUserBackend arrive with their profile already
+    joined, so this usually costs no query; otherwise the profile is
+    fetched once. Roles come from the registry.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return Account(user, None)
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    return Account(user, profile)
+
+
+def ensure_profile(account):
+    """Return the account's profile, creating it with the default role if missing"""
+    if account.profile is None:
+        account.profile = UserProfile.objects.create(user=account.user, role_id=get_default_role_id())
+    return account.profile
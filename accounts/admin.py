@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from .models import UserProfile, UserRole, PasswordResetToken
+from .models import UserProfile, UserRole, PasswordResetToken, EmailOutbox
 
 
 @admin.register(UserRole)
@@ -50,3 +50,11 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
     list_filter = ('is_used', 'created_at')
     search_fields = ('user__username', 'token')
     readonly_fields = ('created_at', 'token')
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('recipients', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AccountsConfig(AppConfig):
@@ -6,4 +7,18 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
+        import accounts.assets  # registers the vendored asset check
         import accounts.signals
+        from accounts.db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='accounts.configure_sqlite')
+
+        from accounts import instrumentation
+        if instrumentation.get_config()['ENABLED']:
+            connection_created.connect(instrumentation.install_query_timer, dispatch_uid='accounts.install_query_timer')
+
+        from accounts import query_audit
+        if query_audit.get_config()['ENABLED']:
+            connection_created.connect(query_audit.install_query_log, dispatch_uid='accounts.install_query_log')
+
+        from accounts.gc import start_scheduler
+        start_scheduler()
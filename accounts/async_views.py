@@ -0,0 +1,204 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.utils import timezone
+
+from . import avatars, hash_pool, page_cache, reset_tokens, throttle
+from .account import ensure_profile
+from .credentials import aresolve_user, filter_by_email, get_profile
+from .forms import PasswordResetRequestForm, UserLoginForm, UserProfileForm
+from .lockout import aregister_failed_attempt, arecord_successful_login, get_lockout_threshold
+from .models import UserProfile
+from .views import get_client_ip, send_password_reset_email
+
+
+# Templates read request.user, the session and the message storage lazily,
+# all of which may query the database, so rendering runs on a thread
+arender = sync_to_async(render)
+
+
+async def _is_authenticated(request):
+    """Evaluate the lazy request.user and request.account off the event loop"""
+    return await sync_to_async(lambda: request.account.is_authenticated)()
+
+
+def alogin_required(login_url):
+    """login_required for coroutine views, which Django 4.2's decorator cannot wrap"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if await _is_authenticated(request):
+                return await view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), login_url)
+        return wrapper
+    return decorator
+
+
+# Only queries when the profile is missing; request.account is already loaded
+aensure_profile = sync_to_async(ensure_profile)
+
+
+async def login_view(request):
+    """Async variant of views.login_view"""
+    if await _is_authenticated(request):
+        return redirect('accounts:dashboard')
+
+    if request.method == 'POST':
+        client_ip = get_client_ip(request)
+        submitted_username = request.POST.get('username', '')
+
+        # Reject abusive clients from the cache before any query or hashing
+        if await sync_to_async(throttle.is_throttled)(client_ip, submitted_username):
+            messages.error(request, 'Too many login attempts. Please try again later.')
+            form = UserLoginForm(initial={'username': submitted_username})
+            return await arender(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'}, status=429)
+
+        resolved_user = await aresolve_user(submitted_username.strip())
+        form = UserLoginForm(request.POST, resolved_user=resolved_user)
+        if form.is_valid():
+            password = form.cleaned_data.get('password')
+            remember_me = form.cleaned_data.get('remember_me')
+
+            user_obj = form.get_user()
+            profile = get_profile(user_obj)
+
+            # Check if account is locked
+            if profile is not None and profile.is_locked:
+                await sync_to_async(throttle.record_failure)(client_ip, submitted_username)
+                messages.error(request, 'Your account is locked due to too many failed login attempts. Please contact support.')
+                return await arender(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'})
+
+            if await hash_pool.acheck_password(user_obj, password) and user_obj.is_active:
+                # Successful login
+                user_obj.backend = 'accounts.backends.ResolvedUserBackend'
+                await sync_to_async(login)(request, user_obj)
+                await sync_to_async(throttle.reset_username)(submitted_username)
+
+                # Set session expiry based on remember_me
+                if remember_me:
+                    request.session.set_expiry(settings.SESSION_REMEMBER_ME_AGE)
+                else:
+                    request.session.set_expiry(0)
+
+                messages.success(request, f'Welcome back, {user_obj.first_name or user_obj.username}!')
+
+                # Update user profile with login info
+                if profile is not None:
+                    await arecord_successful_login(profile, client_ip)
+                else:
+                    await UserProfile.objects.acreate(
+                        user=user_obj,
+                        last_login_ip=client_ip,
+                        last_login=timezone.now()
+                    )
+
+                # Redirect to next page or dashboard
+                next_url = request.GET.get('next')
+                if next_url and next_url.startswith('/'):
+                    return redirect(next_url)
+                return redirect('accounts:dashboard')
+            else:
+                # Failed login attempt
+                await sync_to_async(throttle.record_failure)(client_ip, submitted_username)
+                if profile is not None:
+                    attempts = await aregister_failed_attempt(profile)
+
+                    if profile.is_locked:
+                        messages.warning(
+                            request,
+                            f'Too many failed login attempts ({attempts}). '
+                            'Your account has been locked. Please contact support.'
+                        )
+                    else:
+                        remaining_attempts = get_lockout_threshold() - attempts
+                        messages.error(
+                            request,
+                            f'Invalid credentials. {remaining_attempts} attempts remaining.'
+                        )
+                else:
+                    messages.error(request, 'Invalid username or password.')
+        elif 'username' in form.errors:
+            # Unknown usernames count towards the throttle as well
+            await sync_to_async(throttle.record_failure)(client_ip, submitted_username)
+    else:
+        return await sync_to_async(page_cache.render_shell)(
+            request, 'accounts/login.html',
+            lambda: {'form': UserLoginForm(), 'page_title': 'Login'},
+        )
+
+    context = {'form': form, 'page_title': 'Login'}
+    return await arender(request, 'accounts/login.html', context)
+
+
+@alogin_required(login_url='accounts:login')
+async def dashboard_view(request):
+    """Async variant of views.dashboard_view"""
+    profile = await aensure_profile(request.account)
+
+    context = {
+        'profile': profile,
+        'page_title': 'Dashboard',
+    }
+    return await arender(request, 'accounts/dashboard.html', context)
+
+
+@alogin_required(login_url='accounts:login')
+@avatars.avatar_uploads
+async def profile_view(request):
+    """Async variant of views.profile_view"""
+    profile = await aensure_profile(request.account)
+
+    if request.method == 'POST':
+        form = UserProfileForm(request.POST, request.FILES, instance=profile)
+        avatars.report_rejected_uploads(request, form)
+        if await sync_to_async(form.is_valid)():
+            # Saving may write the avatar to storage as well as the row
+            await sync_to_async(form.save)()
+            messages.success(request, 'Profile updated successfully!')
+            return redirect('accounts:profile')
+    else:
+        form = UserProfileForm(instance=profile)
+
+    context = {
+        'form': form,
+        'profile': profile,
+        'page_title': 'My Profile'
+    }
+    return await arender(request, 'accounts/profile.html', context)
+
+
+async def password_reset_request_view(request):
+    """Async variant of views.password_reset_request_view"""
+    if await _is_authenticated(request):
+        return redirect('accounts:dashboard')
+
+    if request.method == 'POST':
+        form = PasswordResetRequestForm(request.POST)
+        if await sync_to_async(form.is_valid)():
+            email = form.cleaned_data.get('email')
+            user = await filter_by_email(User.objects.all(), email).aget()
+
+            token = await sync_to_async(reset_tokens.make_token)(user)
+
+            # Queue the email; the send_outbox worker delivers it
+            reset_url = request.build_absolute_uri(
+                reverse('accounts:password_reset_confirm', kwargs={'token': token})
+            )
+            await sync_to_async(send_password_reset_email)(
+                user.email, reset_url, user.first_name or user.username
+            )
+
+            messages.success(request, 'Password reset link has been sent to your email.')
+            return redirect('accounts:login')
+    else:
+        form = PasswordResetRequestForm()
+
+    context = {'form': form, 'page_title': 'Reset Password'}
+    return await arender(request, 'accounts/password_reset.html', context)
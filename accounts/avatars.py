@@ -0,0 +1,250 @@
+"""
+Avatar processing.
+
+Uploads are capped while they stream in (AvatarUploadHandler) and checked
+for pixel dimensions from the image header before anything is decoded.
+Decoding and resizing happen after the response, on a small thread pool:
+each size is written as WebP and JPEG under a name derived from a hash of
+the original bytes, so identical uploads share files and the URLs can be
+cached forever. The full-resolution original is deleted once its
+thumbnails exist.
+"""
+import hashlib
+import io
+import logging
+import threading
+from asyncio import iscoroutinefunction
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import close_old_connections, transaction
+from django.middleware.csrf import CsrfViewMiddleware
+from PIL import Image, ImageOps, features
+
+from .models import UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,
+    'MAX_DIMENSION': 4096,
+    'SIZES': {'small': 64, 'medium': 256},
+    'QUALITY': 82,
+    'BACKGROUND': True,
+    'WORKERS': 2,
+}
+
+THUMBNAIL_DIR = 'avatars/thumbs'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AVATAR', {}))
+    return config
+
+
+def get_formats():
+    """Output formats, best first; WebP only when Pillow was built with it"""
+    return ('webp', 'jpeg') if features.check('webp') else ('jpeg',)
+
+
+def thumbnail_name(digest, size, fmt):
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{THUMBNAIL_DIR}/{digest}-{size}.{ext}'
+
+
+class AvatarUploadHandler(FileUploadHandler):
+    """
+    Drop file uploads larger than AVATAR['MAX_UPLOAD_SIZE'] as they stream.
+
+    Oversized files are skipped chunk by chunk instead of being buffered or
+    spooled to disk; the field names are left in request.rejected_uploads
+    so the view can report them.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.limit = get_config()['MAX_UPLOAD_SIZE']
+        self.received = 0
+        if content_length is not None and content_length > self.limit:
+            self._reject()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self._reject()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def _reject(self):
+        if not hasattr(self.request, 'rejected_uploads'):
+            self.request.rejected_uploads = set()
+        self.request.rejected_uploads.add(self.field_name)
+        raise SkipFile()
+
+
+def avatar_uploads(view_func):
+    """
+    Put AvatarUploadHandler first in the upload handlers of view_func's requests.
+
+    Handlers cannot change once the body is parsed, and CsrfViewMiddleware
+    parses it for every POST, so the view is exempt from the middleware and
+    the same CSRF check runs here after the handler is installed.
+    """
+    csrf = CsrfViewMiddleware(view_func)
+
+    def prepare(request, args, kwargs):
+        request.upload_handlers.insert(0, AvatarUploadHandler(request))
+        csrf.process_request(request)
+        return csrf.process_view(request, None, args, kwargs)
+
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            return prepare(request, args, kwargs) or await view_func(request, *args, **kwargs)
+    else:
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            return prepare(request, args, kwargs) or view_func(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def report_rejected_uploads(request, form):
+    """Add a form error for each upload AvatarUploadHandler dropped"""
+    limit_mb = get_config()['MAX_UPLOAD_SIZE'] / (1024 * 1024)
+    for field_name in getattr(request, 'rejected_uploads', ()):
+        form.add_error(field_name, f'Files must be at most {limit_mb:g} MB.')
+
+
+def check_dimensions(image_file):
+    """
+    Error message if an uploaded image is too large, else None.
+
+    Uses the size read from the header by ImageField validation, so no
+    pixel data is decoded.
+    """
+    image = getattr(image_file, 'image', None)
+    if image is None:
+        return None
+    limit = get_config()['MAX_DIMENSION']
+    if image.width > limit or image.height > limit:
+        return f'Images must be at most {limit}x{limit} pixels.'
+    return None
+
+
+def render_thumbnails(data):
+    """{storage name: bytes} of every size and format for an original image"""
+    config = get_config()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        files = {}
+        for size in config['SIZES'].values():
+            thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for fmt in get_formats():
+                name = thumbnail_name(digest, size, fmt)
+                if default_storage.exists(name):
+                    continue
+                out = thumb.convert('RGB') if fmt == 'jpeg' else thumb
+                buffer = io.BytesIO()
+                out.save(buffer, fmt.upper(), quality=config['QUALITY'], optimize=fmt == 'jpeg')
+                files[name] = buffer.getvalue()
+    return digest, files
+
+
+def process_avatar(profile_pk):
+    """
+    Write thumbnails for a profile's pending avatar and drop the original.
+
+    The row is only updated if it still points at the same upload, so a
+    newer upload that arrived in the meantime is left for its own job.
+    """
+    profile = UserProfile.objects.only('avatar', 'avatar_hash').filter(pk=profile_pk).first()
+    if profile is None or not profile.avatar or profile.avatar_hash:
+        return False
+
+    original = profile.avatar.name
+    with default_storage.open(original, 'rb') as f:
+        data = f.read()
+    digest, files = render_thumbnails(data)
+    for name, content in files.items():
+        default_storage.save(name, ContentFile(content))
+
+    largest = max(get_config()['SIZES'].values())
+    updated = UserProfile.objects.filter(pk=profile_pk, avatar=original).update(
+        avatar=thumbnail_name(digest, largest, 'jpeg'),
+        avatar_hash=digest,
+    )
+    if updated and not original.startswith(THUMBNAIL_DIR + '/'):
+        default_storage.delete(original)
+    return bool(updated)
+
+
+def _process_in_background(profile_pk):
+    try:
+        process_avatar(profile_pk)
+    except Exception:
+        logger.exception('Processing avatar for profile %s failed', profile_pk)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_config()['WORKERS'], thread_name_prefix='avatars')
+    return _executor
+
+
+def schedule(profile_pk):
+    """
+    Process a profile's avatar once the current transaction commits.
+
+    Runs on the avatar thread pool unless AVATAR['BACKGROUND'] is off.
+    Uploads left pending by a restart are picked up by process_avatars.
+    """
+    if get_config()['BACKGROUND']:
+        transaction.on_commit(lambda: _get_executor().submit(_process_in_background, profile_pk))
+    else:
+        transaction.on_commit(lambda: process_avatar(profile_pk))
+
+
+def avatar_sources(profile, size_name):
+    """
+    Image sources for a profile's avatar at a named size.
+
+    Returns a dict with the pixel 'size', a JPEG 'src' URL and, where
+    available, a 'webp' URL, or None when the profile has no avatar. An
+    upload that has not been processed yet is served as-is, scaled down by
+    the browser.
+    """
+    if profile is None or not profile.avatar:
+        return None
+    config = get_config()
+    size = config['SIZES'].get(size_name, min(config['SIZES'].values()))
+
+    if not profile.avatar_hash:
+        return {'size': size, 'src': profile.avatar.url}
+
+    sources = {'size': size, 'src': default_storage.url(thumbnail_name(profile.avatar_hash, size, 'jpeg'))}
+    if 'webp' in get_formats():
+        sources['webp'] = default_storage.url(thumbnail_name(profile.avatar_hash, size, 'webp'))
+    return sources
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hash_pool
+
+
+class ResolvedUserBackend(ModelBackend):
+    """
+    Authenticate a user instance that was already fetched by
+    accounts.credentials.resolve_user, so the login path does not
+    query the User table a second time.
+    """
+
+    def authenticate(self, request, user=None, password=None):
+        if user is None or password is None:
+            return None
+        if hash_pool.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        # Join the profile and role so request.account needs no further query
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile__role').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
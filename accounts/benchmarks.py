@@ -0,0 +1,266 @@
+"""
+Load benchmarks for the account flows, used by benchmark_suite.
+
+Each scenario is a pair of functions run by every client thread: an
+optional untimed setup (logging in, for pages behind authentication) and
+a step, whose final request is the one measured. Clients speak plain
+HTTP to a server running in the same process and report a different
+X-Forwarded-For address per iteration, so the per-IP login throttle sees
+many visitors instead of one. Queries per request are read from the
+Server-Timing header that REQUEST_METRICS adds.
+
+Seeded users are split into ranges so scenarios do not interfere: login
+uses the first half, failed_login the third quarter (each user failing
+fewer times than the lockout threshold) and lockout a handful of users
+from the last quarter that lock almost at once.
+"""
+import http.client
+import itertools
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from .provisioning import seed_username
+
+
+SEED_PASSWORD = 'Bench-mark-password-1'
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+LOCKOUT_USERS = 10
+
+
+class Response:
+    __slots__ = ('status', 'elapsed', 'queries')
+
+    def __init__(self, status, elapsed, queries):
+        self.status = status
+        self.elapsed = elapsed
+        self.queries = queries
+
+
+class HttpClient:
+    """A cookie-keeping client for one virtual visitor"""
+
+    def __init__(self, address):
+        self.host, self.port = address
+        self.client_ip = '127.0.0.1'
+        self.cookies = SimpleCookie()
+
+    def reset(self):
+        """Forget cookies, like a new visitor"""
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, data=None):
+        headers = {'Connection': 'close', 'X-Forwarded-For': self.client_ip}
+        cookies = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items() if morsel.value)
+        if cookies:
+            headers['Cookie'] = cookies
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            if 'csrftoken' in self.cookies:
+                headers['X-CSRFToken'] = self.cookies['csrftoken'].value
+
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        elapsed = time.perf_counter() - start
+
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        match = QUERIES_RE.search(response.headers.get('Server-Timing', ''))
+        return Response(response.status, elapsed, int(match.group(1)) if match else None)
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def post(self, path, data):
+        return self.request('POST', path, data)
+
+
+class Context:
+    """What the scenarios know about the seeded database"""
+
+    def __init__(self, users, prefix, run_id, admin_username):
+        self.users = users
+        self.prefix = prefix
+        self.run_id = run_id
+        self.admin_username = admin_username
+
+    def username(self, number):
+        return seed_username(self.prefix, number)
+
+
+def _login(client, username, password=SEED_PASSWORD):
+    client.get(reverse('accounts:login'))
+    return client.post(reverse('accounts:login'), {'username': username, 'password': password})
+
+
+def register(ctx, client, n):
+    client.reset()
+    client.get(reverse('accounts:register'))
+    username = f'{ctx.prefix}r{ctx.run_id}x{n}'
+    response = client.post(reverse('accounts:register'), {
+        'username': username,
+        'email': f'{username}@example.com',
+        'first_name': 'Bench',
+        'last_name': 'Mark',
+        'password1': SEED_PASSWORD,
+        'password2': SEED_PASSWORD,
+    })
+    return response, response.status == 302
+
+
+def login(ctx, client, n):
+    client.reset()
+    response = _login(client, ctx.username(n % (ctx.users // 2)))
+    return response, response.status == 302
+
+
+def failed_login(ctx, client, n):
+    client.reset()
+    quarter = ctx.users // 4
+    response = _login(client, ctx.username(ctx.users // 2 + n % quarter), 'wrong-password')
+    return response, response.status == 200
+
+
+def lockout(ctx, client, n):
+    client.reset()
+    response = _login(client, ctx.username(ctx.users - 1 - n % LOCKOUT_USERS), 'wrong-password')
+    return response, response.status in (200, 429)
+
+
+def password_reset(ctx, client, n):
+    client.reset()
+    client.get(reverse('accounts:password_reset'))
+    email = f'{ctx.username(n % ctx.users)}@example.com'
+    response = client.post(reverse('accounts:password_reset'), {'email': email})
+    return response, response.status == 302
+
+
+def login_as_user(ctx, client, thread_number):
+    _login(client, ctx.username(thread_number % (ctx.users // 2)))
+
+
+def login_as_admin(ctx, client, thread_number):
+    _login(client, ctx.admin_username)
+
+
+def dashboard(ctx, client, n):
+    response = client.get(reverse('accounts:dashboard'))
+    return response, response.status == 200
+
+
+def admin_list(ctx, client, n):
+    response = client.get(reverse('accounts:users_list'))
+    return response, response.status == 200
+
+
+# name: (per-thread setup, measured step)
+SCENARIOS = {
+    'register': (None, register),
+    'login': (None, login),
+    'failed_login': (None, failed_login),
+    'lockout': (None, lockout),
+    'password_reset': (None, password_reset),
+    'dashboard': (login_as_user, dashboard),
+    'admin_list': (login_as_admin, admin_list),
+}
+
+# Smallest seeded database the user ranges above work with
+MIN_USERS = 4 * LOCKOUT_USERS
+
+
+def client_ip(n):
+    return f'10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}'
+
+
+def run_scenario(name, ctx, address, requests, concurrency, warmup=0):
+    """Run a scenario's step requests times over concurrency threads and summarise it"""
+    setup, step = SCENARIOS[name]
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, queries = [], []
+    errors = 0
+
+    def worker(thread_number):
+        nonlocal errors
+        client = HttpClient(address)
+        if setup:
+            setup(ctx, client, thread_number)
+        while True:
+            with lock:
+                n = next(counter)
+            if n >= requests + warmup:
+                return
+            client.client_ip = client_ip(n)
+            response, ok = step(ctx, client, n)
+            if n < warmup:
+                continue
+            with lock:
+                latencies.append(response.elapsed)
+                if response.queries is not None:
+                    queries.append(response.queries)
+                if not ok:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(latencies, queries, errors, time.perf_counter() - start)
+
+
+def summarize(latencies, queries, errors, elapsed):
+    """Latency percentiles in milliseconds, throughput and queries per request"""
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(p50 * 1000, 2),
+        'p95_ms': round(p95 * 1000, 2),
+        'p99_ms': round(p99 * 1000, 2),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of results against an earlier run's results, as messages.
+
+    A scenario regresses when its p95 latency or queries per request grow,
+    or its throughput drops, by more than tolerance (0.2 is 20%).
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms')
+        if previous['throughput'] and current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput {previous["throughput"]}/s -> {current["throughput"]}/s')
+        if (
+            previous.get('queries_per_request') is not None and current['queries_per_request'] is not None
+            and current['queries_per_request'] > previous['queries_per_request'] * (1 + tolerance)
+        ):
+            regressions.append(
+                f'{name}: queries per request {previous["queries_per_request"]} -> {current["queries_per_request"]}'
+            )
+    return regressions
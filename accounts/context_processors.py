@@ -0,0 +1,3 @@
+def account(request):
+    """Make request.account available to templates as {{ account }}"""
+    return {'account': getattr(request, 'account', None)}
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db.models import CharField, Func, Q
+
+
+def canonical_email(email):
+    """
+    The stored and compared form of an email address: lowercased by Python.
+
+    SQLite's LOWER() folds only ASCII, so emails are lowercased here before
+    they are saved (see signals.canonicalize_user_email) and before they are
+    looked up. LOWER() then leaves a stored address unchanged and the index
+    and the lookup parameter always agree, including on non-ASCII letters.
+    """
+    return email.lower() if email else ''
+
+
+class EmailKey(Func):
+    """
+    LOWER(NULLIF(email, '')), the expression indexed by migration 0006.
+
+    The empty string is part of the template rather than a bound parameter
+    so the SQL matches the index expression exactly. Compare it against
+    canonical_email() of the lookup value, never a raw address.
+    """
+    template = "LOWER(NULLIF(%(expressions)s, ''))"
+    output_field = CharField()
+
+
+def email_key():
+    return EmailKey('email')
+
+
+def filter_by_email(queryset, email):
+    """Filter users by email, ignoring case, through the unique email index"""
+    return queryset.annotate(email_key=email_key()).filter(email_key=canonical_email(email))
+
+
+def _candidates(identifier):
+    return (
+        User.objects
+        .select_related('profile__role')
+        .annotate(email_key=email_key())
+        .filter(Q(username=identifier) | Q(email_key=canonical_email(identifier)))
+        .order_by('pk')
+    )
+
+
+def _pick(identifier, users):
+    email_match = None
+    for user in users:
+        if user.username == identifier:
+            return user
+        if email_match is None:
+            email_match = user
+    return email_match
+
+
+def resolve_user(identifier):
+    """
+    Fetch the user matching a username or email together with their
+    profile and role in a single query.
+
+    A username match wins over an email match, so an account whose
+    username looks like someone else's email address still resolves to
+    itself. Returns None when nothing matches.
+    """
+    if not identifier:
+        return None
+    return _pick(identifier, _candidates(identifier))
+
+
+async def aresolve_user(identifier):
+    """Async version of resolve_user()"""
+    if not identifier:
+        return None
+    return _pick(identifier, [user async for user in _candidates(identifier)])
+
+
+def get_profile(user):
+    """Return the already-loaded profile of a resolved user, or None"""
+    try:
+        return user.profile
+    except User.profile.RelatedObjectDoesNotExist:
+        return None
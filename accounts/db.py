@@ -0,0 +1,72 @@
+import asyncio
+import inspect
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+
+# PostgreSQL serialization failure and deadlock
+TRANSIENT_PGCODES = {'40001', '40P01'}
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_transient_error(exc):
+    """True for lock and serialization errors that succeed when retried"""
+    message = str(exc).lower()
+    if 'database is locked' in message or 'database table is locked' in message:
+        return True
+    return getattr(exc.__cause__, 'pgcode', None) in TRANSIENT_PGCODES
+
+
+def _retry_settings():
+    return (
+        getattr(settings, 'DATABASE_LOCK_RETRIES', 3),
+        getattr(settings, 'DATABASE_LOCK_RETRY_DELAY', 0.05),
+    )
+
+
+def retry_on_lock(func):
+    """
+    Retry a write when the database reports a transient lock error.
+
+    Backs off exponentially between attempts. Inside an atomic block the
+    error is re-raised immediately, because the surrounding transaction is
+    already broken and only its owner can retry it.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            retries, delay = _retry_settings()
+            for attempt in range(retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt == retries or not is_transient_error(exc):
+                        raise
+                await asyncio.sleep(delay * 2 ** attempt)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries, delay = _retry_settings()
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or connection.in_atomic_block or not is_transient_error(exc):
+                    raise
+            time.sleep(delay * 2 ** attempt)
+    return wrapper
@@ -9,17 +9,13 @@ def require_role(role_name):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
             if not request.user.is_authenticated:
-                return redirect('login')
+                return redirect('accounts:login')
             
-            try:
-                profile = request.user.profile
-                if profile.role and profile.role.role_name == role_name:
-                    return view_func(request, *args, **kwargs)
-            except:
-                pass
+            if request.account.has_role(role_name):
+                return view_func(request, *args, **kwargs)
             
             messages.error(request, 'Access denied. You do not have permission to access this page.')
-            return redirect('dashboard')
+            return redirect('accounts:dashboard')
         
         return wrapper
     return decorator
@@ -31,17 +27,13 @@ def require_permission(permission_name):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
             if not request.user.is_authenticated:
-                return redirect('login')
+                return redirect('accounts:login')
             
-            try:
-                profile = request.user.profile
-                if profile.has_permission(permission_name):
-                    return view_func(request, *args, **kwargs)
-            except:
-                pass
+            if request.account.has_permission(permission_name):
+                return view_func(request, *args, **kwargs)
             
             messages.error(request, 'Access denied. You do not have this permission.')
-            return redirect('dashboard')
+            return redirect('accounts:dashboard')
         
         return wrapper
     return decorator
@@ -57,15 +49,12 @@ def require_email_verified(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
-            return redirect('login')
+            return redirect('accounts:login')
         
-        try:
-            profile = request.user.profile
-            if not profile.is_email_verified:
-                messages.warning(request, 'Please verify your email first.')
-                return redirect('profile')
-        except:
-            pass
+        profile = request.account.profile
+        if profile is not None and not profile.is_email_verified:
+            messages.warning(request, 'Please verify your email first.')
+            return redirect('accounts:profile')
         
         return view_func(request, *args, **kwargs)
     
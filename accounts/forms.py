@@ -2,7 +2,10 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, SetPasswordForm
 from django.core.exceptions import ValidationError
+from . import avatars, hash_pool
+from .credentials import canonical_email, filter_by_email, resolve_user
 from .models import UserProfile
+from .registration import create_user, find_conflicts
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -11,7 +14,7 @@ class UserRegistrationForm(UserCreationForm):
         required=True,
         widget=forms.EmailInput(attrs={
             'class': 'form-control',
-            'placeholder': 'python manage.py runserver
+            'placeholder': 'Email Address'
         })
     )
     first_name = forms.CharField(
@@ -46,30 +49,41 @@ class UserRegistrationForm(UserCreationForm):
         self.fields['password1'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Password'})
         self.fields['password2'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Confirm Password'})
 
-    def clean_email(self):
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise ValidationError('This email address is already registered.')
-        return email
+    def clean(self):
+        cleaned_data = super().clean()
+        username = cleaned_data.get('username')
+        email = cleaned_data.get('email')
+        if username and email:
+            for field, message in find_conflicts(username, email).items():
+                self.add_error(field, message)
+        return cleaned_data
 
     def clean_username(self):
-        username = self.cleaned_data.get('username')
-        if User.objects.filter(username=username).exists():
-            raise ValidationError('This username is already taken.')
-        return username
+        # Checked case-insensitively together with the email in clean(), in one query
+        return self.cleaned_data.get('username')
+
+    def validate_unique(self):
+        pass
 
     def save(self, commit=True):
-        user = super().save(commit=False)
-        user.email = self.cleaned_data['email']
+        """
+        Hash the password on the shared pool and, with commit, insert the
+        user and profile in one transaction. Raises ValidationError if a
+        concurrent sign-up took the username or email in the meantime.
+        """
+        user = self.instance
+        user.email = canonical_email(self.cleaned_data['email'])
+        hash_pool.set_password(user, self.cleaned_data['password1'])
         if commit:
-            user.save()
-            # Create user profile
-            UserProfile.objects.get_or_create(user=user)
+            create_user(user)
         return user
 
 
+UNRESOLVED = object()
+
+
 class UserLoginForm(forms.Form):
-5    """Form for user login with enhanced validation"""
+    """Form for user login with enhanced validation"""
     username = forms.CharField(
         max_length=150,
         widget=forms.TextInput(attrs={
@@ -95,20 +109,26 @@ class UserLoginForm(forms.Form):
         help_text='Keep me signed in for 30 days'
     )
 
+    def __init__(self, *args, resolved_user=UNRESOLVED, **kwargs):
+        # Async callers resolve the user with aresolve_user() beforehand and
+        # pass the result (None included) so validation never hits the ORM
+        super().__init__(*args, **kwargs)
+        self.resolved_user = resolved_user
+        self.user_cache = None
+
     def clean_username(self):
-        """Validate username - check if user exists"""
+        """Validate username - resolve the user by username or email"""
         username = self.cleaned_data.get('username')
         if not username:
             raise ValidationError('Please enter your username or email.')
         
-        # Check if user exists (by username or email)
-        user_exists = User.objects.filter(
-            username=username
-        ).exists() or User.objects.filter(
-            email=username
-        ).exists()
+        # One query fetches the user, profile and role for the whole login path
+        if self.resolved_user is UNRESOLVED:
+            self.user_cache = resolve_user(username)
+        else:
+            self.user_cache = self.resolved_user
         
-        if not user_exists:
+        if self.user_cache is None:
             raise ValidationError('Invalid username or email address.')
         
         return username
@@ -122,6 +142,10 @@ class UserLoginForm(forms.Form):
             raise ValidationError('Password must be at least 6 characters.')
         return password
 
+    def get_user(self):
+        """Return the user resolved during validation"""
+        return self.user_cache
+
 
 class UserProfileForm(forms.ModelForm):
     """Form for updating user profile"""
@@ -147,6 +171,24 @@ class UserProfileForm(forms.ModelForm):
             }),
         }
 
+    def clean_avatar(self):
+        avatar = self.cleaned_data.get('avatar')
+        error = avatars.check_dimensions(avatar)
+        if error:
+            raise ValidationError(error)
+        return avatar
+
+    def save(self, commit=True):
+        profile = super().save(commit=False)
+        avatar_changed = 'avatar' in self.changed_data
+        if avatar_changed:
+            profile.avatar_hash = ''
+        if commit:
+            profile.save()
+            if avatar_changed and profile.avatar:
+                avatars.schedule(profile.pk)
+        return profile
+
 
 class PasswordResetRequestForm(forms.Form):
     """Form for requesting a password reset"""
@@ -159,7 +201,7 @@ class PasswordResetRequestForm(forms.Form):
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if not User.objects.filter(email=email).exists():
+        if not filter_by_email(User.objects.all(), email).exists():
             raise ValidationError('No user account found with this email address.')
         return email
 
@@ -177,6 +219,13 @@ class PasswordResetForm(SetPasswordForm):
             'placeholder': 'Confirm Password'
         })
 
+    def save(self, commit=True):
+        # Hash on the shared pool instead of the request thread
+        hash_pool.set_password(self.user, self.cleaned_data['new_password1'])
+        if commit:
+            self.user.save()
+        return self.user
+
 
 class PasswordChangeForm(forms.Form):
     """Form for changing password for authenticated users"""
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+from django.contrib.sessions.models import Session
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import PasswordResetToken
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 500,
+    'PAUSE': 0.0,
+    'INTERVAL': 0,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ACCOUNTS_GC', {}))
+    return config
+
+
+@retry_on_lock
+def _delete_range(queryset, first, last):
+    deleted, _ = queryset.filter(pk__gte=first, pk__lte=last).delete()
+    return deleted
+
+
+def delete_in_chunks(queryset, chunk_size=None, pause=None):
+    """
+    Delete the rows of queryset chunk_size at a time, walking the primary key.
+
+    Each chunk is a separate short DELETE over a pk range that still carries
+    the queryset's filter, so rows that stopped matching since they were
+    selected are left alone and no write lock is held between chunks.
+    Returns (rows deleted, seconds taken).
+    """
+    config = get_config()
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    pause = config['PAUSE'] if pause is None else pause
+
+    started = time.monotonic()
+    deleted = 0
+    last_pk = None
+    while True:
+        pending = queryset.order_by('pk')
+        if last_pk is not None:
+            pending = pending.filter(pk__gt=last_pk)
+        pks = list(pending.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        deleted += _delete_range(queryset, pks[0], pks[-1])
+        last_pk = pks[-1]
+        if len(pks) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted, time.monotonic() - started
+
+
+def expired_reset_tokens():
+    return PasswordResetToken.objects.filter(Q(is_used=True) | Q(expires_at__lte=timezone.now()))
+
+
+def collect_reset_tokens(chunk_size=None, pause=None):
+    return delete_in_chunks(expired_reset_tokens(), chunk_size, pause)
+
+
+def collect_sessions(chunk_size=None, pause=None):
+    """
+    Delete expired sessions from the database session table.
+
+    Engines that keep nothing in the table clean up after themselves, so
+    they are handed to their own clear_expired() instead.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    if not issubclass(engine.SessionStore, DBSessionStore):
+        started = time.monotonic()
+        engine.SessionStore.clear_expired()
+        return 0, time.monotonic() - started
+    return delete_in_chunks(Session.objects.filter(expire_date__lt=timezone.now()), chunk_size, pause)
+
+
+COLLECTORS = {
+    'reset_tokens': collect_reset_tokens,
+    'sessions': collect_sessions,
+}
+
+
+def collect(chunk_size=None, pause=None):
+    """Run every collector; returns {name: (rows deleted, seconds)}"""
+    return {name: collector(chunk_size, pause) for name, collector in COLLECTORS.items()}
+
+
+class Scheduler:
+    """Daemon thread that runs collect() every ACCOUNTS_GC['INTERVAL'] seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='accounts-gc', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                for name, (deleted, elapsed) in collect().items():
+                    if deleted:
+                        logger.info('accounts_gc removed %d %s in %.2fs', deleted, name, elapsed)
+            except Exception:
+                logger.exception('accounts_gc run failed')
+            finally:
+                close_old_connections()
+
+
+_scheduler = None
+
+
+def start_scheduler():
+    """Start the in-process scheduler once, if ACCOUNTS_GC['INTERVAL'] is set"""
+    global _scheduler
+    interval = get_config()['INTERVAL']
+    if interval and _scheduler is None:
+        _scheduler = Scheduler(interval)
+        _scheduler.start()
+    return _scheduler
@@ -0,0 +1,265 @@
+"""
+Optional process pool for password hashing.
+
+Hash and verify calls are dispatched to a bounded pool of worker processes
+so a burst of logins does not hold the GIL on every request thread. When
+more than MAX_PENDING jobs are waiting, new work fails fast with
+HashPoolBusy, which HashPoolBusyMiddleware turns into a 503 response.
+With the pool disabled the same functions run inline, so callers never
+need to check which mode is active.
+"""
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from . import instrumentation
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'WORKERS': None,
+    'MAX_PENDING': 64,
+    'TIMEOUT': 10,
+}
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue is full or a job times out"""
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PASSWORD_HASH_POOL', {}))
+    return config
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup(set_prefix=False)
+
+
+def _check(password, encoded):
+    """Verify a password and produce an upgraded hash if the policy changed"""
+    hasher = hashers.identify_hasher(encoded)
+    is_correct = hasher.verify(password, encoded)
+    new_encoded = None
+    if is_correct:
+        preferred = hashers.get_hasher('default')
+        if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+            new_encoded = hashers.make_password(password)
+    return is_correct, new_encoded
+
+
+def _make(password):
+    return hashers.make_password(password)
+
+
+class Metrics:
+    """Queue depth and latency counters, shared by all request threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def enter(self):
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def leave(self, latency):
+        with self._lock:
+            self.queue_depth -= 1
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_latency_ms': (self.total_latency / self.completed * 1000) if self.completed else 0.0,
+                'max_latency_ms': self.max_latency * 1000,
+            }
+
+
+metrics = Metrics()
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(config):
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if _slots is None:
+                    _slots = threading.BoundedSemaphore(config['MAX_PENDING'])
+                _executor = ProcessPoolExecutor(
+                    max_workers=config['WORKERS'],
+                    initializer=_init_worker,
+                )
+    return _executor, _slots
+
+
+def _discard(broken):
+    """Drop a pool whose worker died so the next call starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def shutdown():
+    """Stop the worker processes; the pool is recreated on next use"""
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+        _slots = None
+
+
+def _run(func, *args):
+    config = get_config()
+    start = time.perf_counter()
+
+    if not config['ENABLED']:
+        metrics.enter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.leave(elapsed)
+            instrumentation.add_hash_time(elapsed)
+
+    executor, slots = _get_executor(config)
+    if not slots.acquire(blocking=False):
+        metrics.count('rejected')
+        raise HashPoolBusy('Password hashing queue is full.')
+
+    metrics.enter()
+    try:
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            # A worker died during an earlier job; the job is not to blame
+            _discard(executor)
+            executor, _ = _get_executor(config)
+            future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        metrics.leave(time.perf_counter() - start)
+        raise
+    # The slot is held until the worker is done, not until the caller gives
+    # up, so timed-out jobs still count against MAX_PENDING
+    future.add_done_callback(lambda f: slots.release())
+
+    try:
+        return future.result(timeout=config['TIMEOUT'])
+    except FutureTimeoutError:
+        metrics.count('timed_out')
+        raise HashPoolBusy('Password hashing timed out.')
+    except BrokenProcessPool:
+        _discard(executor)
+        metrics.count('rejected')
+        raise HashPoolBusy('Password hashing worker crashed.')
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.leave(elapsed)
+        instrumentation.add_hash_time(elapsed)
+
+
+def check_password(user, raw_password):
+    """
+    Pool-backed equivalent of user.check_password().
+
+    A stored hash that no longer matches the hashing policy is replaced
+    with the upgraded hash computed by the worker.
+    """
+    if raw_password is None or not hashers.is_password_usable(user.password):
+        return False
+    try:
+        hashers.identify_hasher(user.password)
+    except ValueError:
+        return False
+
+    is_correct, new_encoded = _run(_check, raw_password, user.password)
+    if new_encoded:
+        user.password = new_encoded
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+async def acheck_password(user, raw_password):
+    """
+    Async version of check_password().
+
+    The hash runs on a worker thread that is not tied to the request, so
+    concurrent logins verify in parallel instead of queueing on one thread.
+    """
+    if raw_password is None or not hashers.is_password_usable(user.password):
+        return False
+    try:
+        hashers.identify_hasher(user.password)
+    except ValueError:
+        return False
+
+    is_correct, new_encoded = await sync_to_async(_run, thread_sensitive=False)(
+        _check, raw_password, user.password
+    )
+    if new_encoded:
+        user.password = new_encoded
+        await user.asave(update_fields=['password'])
+    return is_correct
+
+
+def set_password(user, raw_password):
+    """Pool-backed equivalent of user.set_password(); the caller saves the user"""
+    user.password = _run(_make, raw_password)
+    user._password = raw_password
+
+
+def batch_executor(workers=None):
+    """
+    A process pool for batch jobs such as bulk imports.
+
+    Separate from the request pool so a long import neither waits on nor
+    starves interactive logins. Use it as a context manager.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def make_passwords(passwords, executor=None):
+    """Hash a sequence of passwords, in parallel when an executor is given"""
+    if executor is None:
+        return [_make(password) for password in passwords]
+    # Each hash costs far more than the pickling, so small chunks balance best
+    return list(executor.map(_make, passwords, chunksize=8))
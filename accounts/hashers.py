@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def get_hash_cost(algorithm, parameter, default):
+    """Read a cost parameter for an algorithm from PASSWORD_HASH_COST"""
+    costs = getattr(settings, 'PASSWORD_HASH_COST', {})
+    return costs.get(algorithm, {}).get(parameter, default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from settings"""
+
+    @property
+    def iterations(self):
+        return get_hash_cost('pbkdf2', 'iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with time, memory and parallelism taken from settings"""
+
+    @property
+    def time_cost(self):
+        return get_hash_cost('argon2', 'time_cost', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return get_hash_cost('argon2', 'memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return get_hash_cost('argon2', 'parallelism', hashers.Argon2PasswordHasher.parallelism)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt with the work factor taken from settings"""
+
+    @property
+    def work_factor(self):
+        return get_hash_cost('scrypt', 'work_factor', hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return get_hash_cost('scrypt', 'block_size', hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return get_hash_cost('scrypt', 'parallelism', hashers.ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        # hashlib's 32 MiB default is too small for work factors above 2**14
+        default = 256 * self.block_size * self.work_factor * self.parallelism
+        return get_hash_cost('scrypt', 'maxmem', default)
+
+
+# Cost parameter each algorithm is swept over by the benchmark_hashers command
+COST_PARAMETERS = {
+    'pbkdf2_sha256': 'iterations',
+    'argon2': 'time_cost',
+    'scrypt': 'work_factor',
+}
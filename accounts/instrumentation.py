@@ -0,0 +1,297 @@
+"""
+Per-view request metrics.
+
+RequestMetricsMiddleware (accounts.middleware) times each request and, through hooks in the
+database wrapper, the password hashing pool, the template backend and
+the cached pages, how much of it went to SQL, hashing, rendering and
+cache lookups. Totals are kept per view in fixed-bucket histograms held
+in process memory, exposed in the Prometheus text format by metrics_view
+and, per response, in a Server-Timing header.
+
+Each process keeps its own registry; scrape every worker.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+from django.template.backends.django import reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from . import hash_pool
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SERVER_TIMING': False,
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    'ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'TOKEN': None,
+}
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REQUEST_METRICS', {}))
+    return config
+
+
+class RequestTimings:
+    """What one request spent, filled in by the hooks while it runs"""
+    __slots__ = ('start', 'db_queries', 'db_time', 'hash_time', 'template_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.hash_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+_current = ContextVar('accounts_request_timings', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with its counts allocated up front"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, count) pairs as Prometheus reports them, ending at +Inf"""
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    """Histograms and counters for one view"""
+    __slots__ = ('lock', 'duration', 'db_time', 'hash_time', 'template_time', 'db_queries', 'cache_hits', 'cache_misses')
+
+    def __init__(self, bounds):
+        self.lock = threading.Lock()
+        self.duration = Histogram(bounds)
+        self.db_time = Histogram(bounds)
+        self.hash_time = Histogram(bounds)
+        self.template_time = Histogram(bounds)
+        self.db_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record(self, timings, duration):
+        with self.lock:
+            self.duration.observe(duration)
+            self.db_time.observe(timings.db_time)
+            self.hash_time.observe(timings.hash_time)
+            self.template_time.observe(timings.template_time)
+            self.db_queries += timings.db_queries
+            self.cache_hits += timings.cache_hits
+            self.cache_misses += timings.cache_misses
+
+
+class Registry:
+    """ViewMetrics by view name, created the first time a view is seen"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def get(self, view_name):
+        view = self._views.get(view_name)
+        if view is None:
+            with self._lock:
+                view = self._views.get(view_name)
+                if view is None:
+                    view = self._views[view_name] = ViewMetrics(tuple(get_config()['BUCKETS']))
+        return view
+
+    def items(self):
+        with self._lock:
+            return sorted(self._views.items())
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+
+registry = Registry()
+
+
+# Hooks
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_time += time.perf_counter() - start
+        timings.db_queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created handler wrapping every new connection with time_query"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def add_hash_time(seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.hash_time += seconds
+
+
+def record_cache(hit):
+    timings = _current.get()
+    if timings is None:
+        return
+    if hit:
+        timings.cache_hits += 1
+    else:
+        timings.cache_misses += 1
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """The Django template backend, with render time added to the current request"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# Collection
+
+def start_request():
+    """Begin collecting timings for the current request"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def finish_request():
+    _current.set(None)
+
+
+def record(request, timings):
+    """Add a finished request to its view's metrics and return its duration"""
+    duration = time.perf_counter() - timings.start
+    match = getattr(request, 'resolver_match', None)
+    registry.get(match.view_name if match else UNRESOLVED_VIEW).record(timings, duration)
+    return duration
+
+
+# Exposition
+
+def server_timing(timings, duration):
+    return (
+        f'total;dur={duration * 1000:.1f}, '
+        f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries", '
+        f'hash;dur={timings.hash_time * 1000:.1f}, '
+        f'template;dur={timings.template_time * 1000:.1f}, '
+        f'cache;desc="{timings.cache_hits} hits, {timings.cache_misses} misses"'
+    )
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_histogram(lines, name, help_text, views, attr):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for view_name, view in views:
+        label = f'view="{_escape(view_name)}"'
+        histogram = getattr(view, attr)
+        with view.lock:
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+
+def _write_counter(lines, name, help_text, views, attr):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for view_name, view in views:
+        lines.append(f'{name}{{view="{_escape(view_name)}"}} {getattr(view, attr)}')
+
+
+def render_metrics():
+    """The registry in the Prometheus text exposition format"""
+    views = registry.items()
+    lines = []
+    _write_histogram(lines, 'accounts_request_duration_seconds', 'Wall time of requests.', views, 'duration')
+    _write_histogram(lines, 'accounts_db_duration_seconds', 'Time spent in SQL per request.', views, 'db_time')
+    _write_histogram(lines, 'accounts_password_hash_duration_seconds', 'Time spent hashing or verifying passwords per request.', views, 'hash_time')
+    _write_histogram(lines, 'accounts_template_duration_seconds', 'Time spent rendering templates per request.', views, 'template_time')
+    _write_counter(lines, 'accounts_db_queries_total', 'SQL queries executed.', views, 'db_queries')
+    _write_counter(lines, 'accounts_cache_hits_total', 'Cached pages and counts served from the cache.', views, 'cache_hits')
+    _write_counter(lines, 'accounts_cache_misses_total', 'Cached pages and counts that had to be rebuilt.', views, 'cache_misses')
+
+    pool = hash_pool.metrics.snapshot()
+    lines.append('# HELP accounts_hash_pool_queue_depth Password hashing jobs waiting or running.')
+    lines.append('# TYPE accounts_hash_pool_queue_depth gauge')
+    lines.append(f'accounts_hash_pool_queue_depth {pool["queue_depth"]}')
+    lines.append('# HELP accounts_hash_pool_rejected_total Password hashing jobs refused or timed out.')
+    lines.append('# TYPE accounts_hash_pool_rejected_total counter')
+    lines.append(f'accounts_hash_pool_rejected_total {pool["rejected"] + pool["timed_out"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+
+    Answers 404 while metrics are off. Open to REQUEST_METRICS['ALLOWED_IPS'],
+    or to any client sending the configured TOKEN as a bearer token.
+    """
+    config = get_config()
+    if not config['ENABLED']:
+        raise Http404()
+    token = config['TOKEN']
+    ip_allowed = request.META.get('REMOTE_ADDR') in config['ALLOWED_IPS']
+    token_ok = bool(token) and hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {token}'.encode(),
+    )
+    if not (ip_allowed or token_ok):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
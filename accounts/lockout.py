@@ -0,0 +1,149 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import UserProfile
+
+
+def get_lockout_threshold():
+    """Number of failed attempts after which an account is locked"""
+    return getattr(settings, 'ACCOUNT_LOCKOUT_THRESHOLD', 5)
+
+
+def get_lockout_window():
+    """
+    Period within which failed attempts are counted together.
+
+    Attempts older than the window start a fresh count. None (or 0)
+    keeps counting until the next successful login.
+    """
+    window = getattr(settings, 'ACCOUNT_LOCKOUT_WINDOW', None)
+    if not window:
+        return None
+    if not isinstance(window, timedelta):
+        window = timedelta(seconds=window)
+    return window
+
+
+def _failed_attempt(profile):
+    """
+    Build the conditional UPDATE for a failed login and mirror its result.
+
+    Returns the update kwargs; the instance already reflects the state the
+    database will hold once they are applied.
+    """
+    threshold = get_lockout_threshold()
+    window = get_lockout_window()
+    now = timezone.now()
+
+    lock_condition = {'login_attempts__gte': threshold - 1}
+
+    if window is None:
+        attempts = F('login_attempts') + 1
+        in_window = True
+    else:
+        window_start = now - window
+        lock_condition['last_login_attempt__gte'] = window_start
+        attempts = Case(
+            When(last_login_attempt__gte=window_start, then=F('login_attempts') + 1),
+            default=Value(1),
+        )
+        in_window = (
+            profile.last_login_attempt is not None
+            and profile.last_login_attempt >= window_start
+        )
+
+    if threshold <= 1:
+        locked = Value(True)
+    else:
+        locked = Case(
+            When(then=Value(True), **lock_condition),
+            default=F('is_locked'),
+        )
+
+    # Mirror the database state without reading the row back
+    if in_window:
+        profile.login_attempts = (profile.login_attempts or 0) + 1
+    else:
+        profile.login_attempts = 1
+    profile.is_locked = profile.is_locked or profile.login_attempts >= threshold
+    profile.last_login_attempt = now
+
+    return {
+        'login_attempts': attempts,
+        'is_locked': locked,
+        'last_login_attempt': now,
+    }
+
+
+@retry_on_lock
+def _update_profile(pk, update):
+    UserProfile.objects.filter(pk=pk).update(**update)
+
+
+@retry_on_lock
+async def _aupdate_profile(pk, update):
+    await UserProfile.objects.filter(pk=pk).aupdate(**update)
+
+
+def register_failed_attempt(profile):
+    """
+    Record a failed login against a profile with a single conditional UPDATE.
+
+    The increment and the lock decision are evaluated by the database, so
+    concurrent failures never lose an increment and no other column of the
+    profile is rewritten. The instance is updated to mirror the new state
+    and the resulting attempt count is returned.
+    """
+    update = _failed_attempt(profile)
+    _update_profile(profile.pk, update)
+    profile._snapshot_fields(update)
+    return profile.login_attempts
+
+
+async def aregister_failed_attempt(profile):
+    """Async version of register_failed_attempt()"""
+    update = _failed_attempt(profile)
+    await _aupdate_profile(profile.pk, update)
+    profile._snapshot_fields(update)
+    return profile.login_attempts
+
+
+def _successful_login(profile, ip_address):
+    """Apply a successful login to the instance and return the changed fields"""
+    profile.last_login_ip = ip_address
+    profile.last_login = timezone.now()
+    update_fields = ['last_login_ip', 'last_login']
+
+    if profile.login_attempts:
+        profile.login_attempts = 0
+        update_fields.append('login_attempts')
+    if profile.is_locked:
+        profile.is_locked = False
+        update_fields.append('is_locked')
+    return update_fields
+
+
+@retry_on_lock
+def _save_profile(profile, update_fields):
+    profile.save(update_fields=update_fields)
+
+
+@retry_on_lock
+async def _asave_profile(profile, update_fields):
+    await profile.asave(update_fields=update_fields)
+
+
+def record_successful_login(profile, ip_address):
+    """Reset the failure counter and store login details, writing only changed columns"""
+    # Fields are collected once: on a retry the instance already holds the
+    # new values, and comparing again would drop the reset from the UPDATE
+    _save_profile(profile, _successful_login(profile, ip_address))
+
+
+async def arecord_successful_login(profile, ip_address):
+    """Async version of record_successful_login()"""
+    await _asave_profile(profile, _successful_login(profile, ip_address))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.gc import COLLECTORS, get_config
+
+
+class Command(BaseCommand):
+    help = 'Delete used or expired password reset tokens and expired sessions in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Rows deleted per statement (default: ACCOUNTS_GC["CHUNK_SIZE"])',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help='Seconds to sleep between chunks so live writes get the lock (default: ACCOUNTS_GC["PAUSE"])',
+        )
+        parser.add_argument(
+            '--only', choices=sorted(COLLECTORS), action='append',
+            help='Collect only this table; may be repeated',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep collecting instead of exiting after one pass',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Seconds between passes with --loop (default: ACCOUNTS_GC["INTERVAL"] or 3600)',
+        )
+
+    def handle(self, *args, **options):
+        names = options['only'] or list(COLLECTORS)
+        interval = options['interval'] or get_config()['INTERVAL'] or 3600
+
+        try:
+            while True:
+                for name in names:
+                    deleted, elapsed = COLLECTORS[name](options['chunk_size'], options['pause'])
+                    rate = deleted / elapsed if elapsed else 0
+                    self.stdout.write(f'{name}: deleted {deleted} rows in {elapsed:.2f}s ({rate:.0f} rows/s)')
+                if not options['loop']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,95 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import COST_PARAMETERS
+
+
+class Command(BaseCommand):
+    help = 'Measure password verifications per second per core for each configured hasher and cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--samples', type=int, default=5,
+            help='Verifications timed per hasher and cost (default: 5)',
+        )
+        parser.add_argument(
+            '--algorithm', action='append', dest='algorithms', default=None,
+            help='Only benchmark this algorithm (e.g. pbkdf2_sha256); may be repeated',
+        )
+        parser.add_argument(
+            '--cost', action='append', dest='costs', default=[], metavar='ALGORITHM=VALUE[,VALUE...]',
+            help='Sweep extra cost values, e.g. pbkdf2_sha256=200000,400000 or scrypt=16384,32768',
+        )
+        parser.add_argument(
+            '--budget', type=float, default=None, metavar='MS',
+            help='Latency budget per login in milliseconds; flags costs that exceed it',
+        )
+
+    def handle(self, *args, **options):
+        samples = options['samples']
+        if samples < 1:
+            raise CommandError('--samples must be at least 1.')
+
+        sweeps = self._parse_costs(options['costs'])
+        budget = options['budget']
+
+        self.stdout.write(f'{"algorithm":<16} {"parameter":<12} {"cost":>10} {"ms/login":>10} {"logins/s/core":>14}')
+        for hasher in get_hashers():
+            if options['algorithms'] and hasher.algorithm not in options['algorithms']:
+                continue
+
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError as exc:
+                    self.stdout.write(self.style.WARNING(f'{hasher.algorithm:<16} skipped: {exc}'))
+                    continue
+
+            parameter = COST_PARAMETERS.get(hasher.algorithm)
+            costs = [getattr(hasher, parameter)] if parameter else [None]
+            costs += [cost for cost in sweeps.get(hasher.algorithm, []) if cost not in costs]
+
+            for cost in costs:
+                candidate = self._with_cost(hasher, parameter, cost)
+                elapsed_ms = self._time_verify(candidate, samples)
+                line = (
+                    f'{hasher.algorithm:<16} {parameter or "-":<12} {cost if cost is not None else "-":>10} '
+                    f'{elapsed_ms:>10.1f} {1000 / elapsed_ms:>14.1f}'
+                )
+                if budget is not None and elapsed_ms > budget:
+                    self.stdout.write(self.style.ERROR(f'{line}  over budget'))
+                else:
+                    self.stdout.write(line)
+
+    def _parse_costs(self, values):
+        sweeps = {}
+        for value in values:
+            algorithm, sep, costs = value.partition('=')
+            if not sep:
+                raise CommandError(f'Invalid --cost value "{value}", expected ALGORITHM=VALUE[,VALUE...].')
+            try:
+                sweeps.setdefault(algorithm, []).extend(int(cost) for cost in costs.split(','))
+            except ValueError:
+                raise CommandError(f'Invalid --cost value "{value}", costs must be integers.')
+        return sweeps
+
+    def _with_cost(self, hasher, parameter, cost):
+        """Return a hasher instance that hashes at the given cost"""
+        if parameter is None:
+            return hasher
+        # A class attribute on a subclass overrides the settings-backed property
+        subclass = type(hasher.__class__.__name__, (hasher.__class__,), {parameter: cost})
+        return subclass()
+
+    def _time_verify(self, hasher, samples):
+        """Median wall time of one verification in milliseconds"""
+        encoded = hasher.encode('benchmark-password', hasher.salt())
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.verify('benchmark-password', encoded)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
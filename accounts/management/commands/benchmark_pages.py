@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from accounts.page_cache import get_config
+
+
+class Command(BaseCommand):
+    help = 'Measure anonymous GET requests per second with and without cached page shells'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths', default=None,
+            help='Page to request (default: /accounts/login/); may be repeated',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Requests timed per page and mode (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        if count < 1:
+            raise CommandError('--requests must be at least 1.')
+
+        self.stdout.write(f'{"path":<24} {"mode":<8} {"req/s":>9} {"ms/req":>8} {"bytes":>8}')
+        for path in options['paths'] or ['/accounts/login/']:
+            for mode, enabled in (('render', False), ('shell', True)):
+                config = dict(get_config(), ENABLED=enabled)
+                with override_settings(PAGE_CACHE=config, ALLOWED_HOSTS=['*']):
+                    rate, size = self._measure(path, count)
+                self.stdout.write(f'{path:<24} {mode:<8} {rate:>9.0f} {1000 / rate:>8.2f} {size:>8}')
+
+    def _measure(self, path, count):
+        # Also renders and stores the shell when caching is on
+        response = Client().get(path)
+        if response.status_code != 200:
+            raise CommandError(f'GET {path} returned {response.status_code}.')
+
+        start = time.perf_counter()
+        for _ in range(count):
+            # A fresh client per request, like a first-time visitor
+            Client().get(path)
+        elapsed = time.perf_counter() - start
+        return count / elapsed, len(response.content)
@@ -0,0 +1,80 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.forms import UserRegistrationForm
+
+
+class Command(BaseCommand):
+    help = 'Register throwaway users through UserRegistrationForm and report registrations per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=200,
+            help='Registrations to perform (default: 200)',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Concurrent registration threads (default: 4)',
+        )
+        parser.add_argument(
+            '--cheap-hash', action='store_true',
+            help='Hash with MD5 so the numbers show database cost rather than password hashing',
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the created users instead of deleting them afterwards',
+        )
+
+    def handle(self, *args, **options):
+        count, threads = options['count'], options['threads']
+        if count < 1 or threads < 1:
+            raise CommandError('--count and --threads must be at least 1.')
+
+        prefix = f'bench{uuid.uuid4().hex[:8]}'
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher'] if options['cheap_hash'] else None
+        with override_settings(**({'PASSWORD_HASHERS': hashers} if hashers else {})):
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    self._register(f'{prefix}first')
+                self.stdout.write(f'Queries per registration: {len(queries)}')
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    failures = sum(not ok for ok in pool.map(self._register_in_thread, (
+                        f'{prefix}{i}' for i in range(count)
+                    )))
+                elapsed = time.perf_counter() - start
+            finally:
+                if not options['keep']:
+                    User.objects.filter(username__startswith=prefix).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{count - failures} registrations in {elapsed:.2f}s with {threads} threads '
+            f'({(count - failures) / elapsed:.1f}/s), {failures} failed'
+        ))
+
+    def _register(self, username):
+        form = UserRegistrationForm({
+            'username': username,
+            'email': f'{username}@example.com',
+            'first_name': 'Bench',
+            'last_name': 'Mark',
+            'password1': 'Bench-mark-password-1',
+            'password2': 'Bench-mark-password-1',
+        })
+        if not form.is_valid():
+            return False
+        form.save()
+        return True
+
+    def _register_in_thread(self, username):
+        try:
+            return self._register(username)
+        finally:
+            close_old_connections()
@@ -0,0 +1,82 @@
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# Roughly what an authenticated session carries after login
+SAMPLE_DATA = {
+    '_auth_user_id': '1',
+    '_auth_user_backend': 'accounts.backends.ResolvedUserBackend',
+    '_auth_user_hash': 'f' * 64,
+    '_session_expiry': 30 * 24 * 60 * 60,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request cost of loading and re-saving a session with each session engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--samples', type=int, default=200,
+            help='Loads and saves timed per engine (default: 200)',
+        )
+        parser.add_argument(
+            '--engine', action='append', dest='engines', default=None, choices=sorted(settings.SESSION_ENGINES),
+            help='Only benchmark this engine; may be repeated',
+        )
+
+    def handle(self, *args, **options):
+        samples = options['samples']
+        if samples < 1:
+            raise CommandError('--samples must be at least 1.')
+
+        self.stdout.write(
+            f'{"engine":<16} {"load ms":>9} {"load queries":>13} {"save ms":>9} {"save queries":>13}'
+        )
+        for name, path in settings.SESSION_ENGINES.items():
+            if options['engines'] and name not in options['engines']:
+                continue
+            store_class = import_module(path).SessionStore
+            load_ms, load_queries, save_ms, save_queries = self._benchmark(store_class, samples)
+            self.stdout.write(
+                f'{name:<16} {load_ms:>9.3f} {load_queries:>13.1f} {save_ms:>9.3f} {save_queries:>13.1f}'
+            )
+
+    def _benchmark(self, store_class, samples):
+        """Median milliseconds and mean queries for one load and one save"""
+        session = store_class()
+        session.update(SAMPLE_DATA)
+        session.save()
+        session_key = session.session_key
+
+        load_timings, save_timings = [], []
+        load_queries = save_queries = 0
+        try:
+            for i in range(samples):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    session = store_class(session_key)
+                    session.get('_auth_user_id')
+                    load_timings.append((time.perf_counter() - start) * 1000)
+                load_queries += len(queries)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    session['_session_refreshed_at'] = i
+                    session.save()
+                    save_timings.append((time.perf_counter() - start) * 1000)
+                save_queries += len(queries)
+                # Signed cookies carry their data in the key itself
+                session_key = session.session_key
+        finally:
+            session.delete()
+
+        return (
+            statistics.median(load_timings), load_queries / samples,
+            statistics.median(save_timings), save_queries / samples,
+        )
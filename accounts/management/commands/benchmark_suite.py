@@ -0,0 +1,213 @@
+import json
+import os
+import platform
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.testcases import LiveServerThread, _StaticFilesHandler
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts import benchmarks, instrumentation
+from accounts.models import UserProfile, UserRole
+from accounts.provisioning import seed_users
+from accounts.roles import registry
+
+
+PREFIX = 'bench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the account flows against an in-process server and a seeded test database, '
+        'reporting latency percentiles, throughput and queries per request as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10000,
+            help='Users to seed the benchmark database with (default: 10000)',
+        )
+        parser.add_argument(
+            '--scenarios', default=','.join(benchmarks.SCENARIOS),
+            help=f'Comma-separated scenarios to run (default: {",".join(benchmarks.SCENARIOS)})',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Measured requests per scenario (default: 200)',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Client threads per scenario (default: 8)',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Unmeasured requests run first in each scenario (default: 20)',
+        )
+        parser.add_argument(
+            '--cheap-hash', action='store_true',
+            help='Hash with MD5 so the numbers show everything but password hashing; '
+                 'a database kept with --keepdb must be reused with the same choice',
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep the seeded test database for the next run instead of rebuilding it',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Users inserted per transaction while seeding (default: 5000)',
+        )
+        parser.add_argument(
+            '--output', default=None, metavar='PATH',
+            help='Write the results as JSON to PATH',
+        )
+        parser.add_argument(
+            '--baseline', default=None, metavar='PATH',
+            help='Results of an earlier run; exit with an error if any scenario regressed',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed regression against --baseline as a fraction (default: 0.2)',
+        )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(names) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}.')
+        if options['users'] < benchmarks.MIN_USERS:
+            raise CommandError(f'--users must be at least {benchmarks.MIN_USERS}.')
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        overrides = {
+            # DEBUG would record every query in memory; without it the
+            # manifest storage wants collectstatic, which static files
+            # served by the test server do not need
+            'DEBUG': False,
+            'STORAGES': dict(settings.STORAGES, staticfiles={
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            }),
+            # Queries per request come from the Server-Timing header
+            'REQUEST_METRICS': dict(settings.REQUEST_METRICS, ENABLED=True, SERVER_TIMING=True),
+            'QUERY_AUDIT': dict(settings.QUERY_AUDIT, ENABLED=False),
+            # A private cache, so throttle counters and cached pages start empty
+            # and a shared production cache is never touched
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+            # The load generator stands in for a proxy, so the X-Forwarded-For
+            # address it sends spreads failed logins over many throttle keys
+            'TRUSTED_PROXY_COUNT': 1,
+        }
+        if options['cheap_hash']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        with override_settings(**overrides):
+            old_name = self._create_database(options['keepdb'])
+            try:
+                results = self._run(names, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, options['tolerance'])
+            if regressions:
+                for message in regressions:
+                    self.stderr.write(message)
+                raise CommandError(f'{len(regressions)} regressions beyond {options["tolerance"]:.0%} of the baseline.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions beyond {options["tolerance"]:.0%} of the baseline.'))
+
+    def _create_database(self, keepdb):
+        """Switch to a test database, on disk for SQLite so server threads share it"""
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'accounts_benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+        registry.clear()
+        connection_created.connect(instrumentation.install_query_timer, dispatch_uid='accounts.install_query_timer')
+        return old_name
+
+    def _run(self, names, options):
+        users = options['users']
+        seeded = seed_users(
+            users, benchmarks.SEED_PASSWORD, prefix=PREFIX, batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(f'Seeded {done}/{users} users', ending='\r'),
+        )
+        self.stdout.write(f'Seeded {seeded} users ({users} in the database)')
+
+        # Start every run from unlocked accounts, also when the database was kept
+        UserProfile.objects.filter(user__username__startswith=f'{PREFIX}-').exclude(
+            login_attempts=0, is_locked=False,
+        ).update(login_attempts=0, is_locked=False, last_login_attempt=None)
+        admin_username = self._ensure_admin()
+
+        ctx = benchmarks.Context(users, PREFIX, uuid.uuid4().hex[:8], admin_username)
+        server = LiveServerThread('localhost', _StaticFilesHandler)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise server.error
+
+        results = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'users': users,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'cheap_hash': options['cheap_hash'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+            },
+            'scenarios': {},
+        }
+        try:
+            for name in names:
+                self.stdout.write(f'Running {name}...')
+                results['scenarios'][name] = benchmarks.run_scenario(
+                    name, ctx, (server.host, server.port),
+                    options['requests'], options['concurrency'], options['warmup'],
+                )
+        finally:
+            server.terminate()
+        return results
+
+    def _ensure_admin(self):
+        username = f'{PREFIX}admin'
+        role, _ = UserRole.objects.get_or_create(role_name='admin', defaults={
+            'can_delete_users': True,
+            'can_edit_users': True,
+            'can_view_reports': True,
+            'can_moderate_content': True,
+        })
+        user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+        if created:
+            user.set_password(benchmarks.SEED_PASSWORD)
+            user.save()
+        UserProfile.objects.update_or_create(user=user, defaults={'role': role, 'login_attempts': 0, 'is_locked': False})
+        return username
+
+    def _report(self, results):
+        header = f'{"scenario":<16}{"req":>6}{"err":>5}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}'
+        self.stdout.write(header)
+        for name, result in results['scenarios'].items():
+            queries = result['queries_per_request']
+            self.stdout.write(
+                f'{name:<16}{result["requests"]:>6}{result["errors"]:>5}{result["throughput"]:>9}'
+                f'{result["p50_ms"]:>9}{result["p95_ms"]:>9}{result["p99_ms"]:>9}'
+                f'{"-" if queries is None else queries:>9}'
+            )
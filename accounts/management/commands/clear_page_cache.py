@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.page_cache import get_deploy_version, invalidate
+
+
+SHELL_TEMPLATES = ('home.html', 'accounts/login.html', 'accounts/register.html')
+
+
+class Command(BaseCommand):
+    help = 'Drop cached anonymous page shells so they are rendered again'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'templates', nargs='*',
+            help=f'Templates to drop (default: {", ".join(SHELL_TEMPLATES)})',
+        )
+
+    def handle(self, *args, **options):
+        templates = options['templates'] or SHELL_TEMPLATES
+        for template_name in templates:
+            invalidate(template_name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Cleared {len(templates)} page shells for version {get_deploy_version()}'
+        ))
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from accounts.exports import DEFAULT_CHUNK_SIZE, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Write every user with profile and role fields as CSV or JSONL, streaming rows from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument(
+            '--output', '-o', default=None,
+            help='File to write (default: standard output)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows fetched from the database at a time (default: {DEFAULT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        lines = iter_export(options['format'], chunk_size=options['chunk_size'])
+        if options['output'] is None:
+            sys.stdout.writelines(lines)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            f.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
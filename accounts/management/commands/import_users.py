@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import hash_pool
+from accounts.provisioning import FORMATS, Importer, chunked, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = 'Create users and profiles in bulk from a CSV or JSONL file, resuming from a checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file of users')
+        parser.add_argument(
+            '--format', choices=FORMATS, default=None,
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Records validated and inserted per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Processes hashing passwords (default: one per CPU; 0 hashes inline)',
+        )
+        parser.add_argument(
+            '--invite-base-url', default=None, metavar='URL',
+            help='Email a set-password link under this site URL to users imported without a password',
+        )
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help='Progress file used to resume an interrupted import (default: PATH.checkpoint)',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore an existing checkpoint and start from the first record',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File "{path}" does not exist.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        fmt = options['format'] or detect_format(path)
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = 0 if options['restart'] else self._load_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f'Resuming after record {done}')
+
+        workers = options['workers']
+        executor = hash_pool.batch_executor(workers) if workers != 0 else nullcontext()
+
+        created = failed = 0
+        started = time.monotonic()
+        with executor as pool, open(path, newline='', encoding='utf-8') as stream:
+            importer = Importer(executor=pool, invite_base_url=options['invite_base_url'])
+            records = islice(read_records(stream, fmt), done, None)
+
+            for chunk in chunked(records, options['batch_size']):
+                rows, errors = importer.validate(chunk, done + 1)
+                users = importer.insert(rows)
+                done += len(chunk)
+                self._save_checkpoint(checkpoint, path, done)
+
+                created += len(users)
+                failed += len(errors)
+                for number, message in errors:
+                    self.stderr.write(f'Record {number}: {message}')
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{done} records read, {created} created, {failed} rejected '
+                    f'({created / elapsed if elapsed else 0:.0f} users/s)'
+                )
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} users in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f} users/s), '
+            f'{failed} records rejected'
+        ))
+
+    def _load_checkpoint(self, checkpoint, path):
+        """Number of records already committed by an earlier run of this import"""
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state.get('path') != os.path.abspath(path):
+            raise CommandError(f'Checkpoint "{checkpoint}" belongs to another file; use --restart or --checkpoint.')
+        return state['records']
+
+    def _save_checkpoint(self, checkpoint, path, records):
+        # Written after each committed chunk and renamed into place, so a
+        # crash leaves either the old or the new position, never a torn file
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'path': os.path.abspath(path), 'records': records}, f)
+        os.replace(tmp, checkpoint)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.avatars import process_avatar
+from accounts.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails for avatars that were uploaded but not processed yet'
+
+    def handle(self, *args, **options):
+        pending = (
+            UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True)
+            .filter(avatar_hash='')
+            .values_list('pk', flat=True)
+        )
+        processed = failed = 0
+        for pk in pending.iterator():
+            try:
+                processed += process_avatar(pk)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'Profile {pk}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} avatars, {failed} failed'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.gc import delete_in_chunks, expired_reset_tokens
+from accounts.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = 'Delete used and expired rows from the PasswordResetToken table in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Delete every row, e.g. after switching to signed reset tokens',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Rows deleted per statement (default: ACCOUNTS_GC["CHUNK_SIZE"])',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help='Seconds to sleep between chunks so live writes get the lock (default: ACCOUNTS_GC["PAUSE"])',
+        )
+
+    def handle(self, *args, **options):
+        tokens = PasswordResetToken.objects.all() if options['all'] else expired_reset_tokens()
+        deleted, elapsed = delete_in_chunks(tokens, options['chunk_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} password reset tokens in {elapsed:.2f}s'))
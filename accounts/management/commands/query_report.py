@@ -0,0 +1,65 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.query_audit import get_config
+
+
+class Command(BaseCommand):
+    help = 'Summarise the repeated queries QUERY_AUDIT recorded, worst first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help="Report file (default: QUERY_AUDIT['REPORT_PATH'])",
+        )
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Offenders to show (default: 10)',
+        )
+        parser.add_argument(
+            '--fail', action='store_true',
+            help='Exit with an error when anything was recorded, e.g. at the end of a CI run',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete the report file after summarising it',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_config()['REPORT_PATH']
+        if not path:
+            raise CommandError("Set QUERY_AUDIT['REPORT_PATH'] or pass --path.")
+        if not os.path.exists(path):
+            self.stdout.write(self.style.SUCCESS('No repeated queries recorded.'))
+            return
+
+        offenders = {}
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                where = record['stack'][0] if record['stack'] else '<no project frames>'
+                key = (record['shape'], where, record['template'])
+                summary = offenders.setdefault(key, {'requests': 0, 'queries': 0, 'worst': 0, 'labels': set()})
+                summary['requests'] += 1
+                summary['queries'] += record['count']
+                summary['worst'] = max(summary['worst'], record['count'])
+                summary['labels'].add(record['label'])
+
+        ranked = sorted(offenders.items(), key=lambda item: (-item[1]['queries'], -item[1]['worst']))
+        for (shape, where, template), summary in ranked[:options['limit']]:
+            self.stdout.write(self.style.WARNING(
+                f'{summary["queries"]} queries in {summary["requests"]} requests '
+                f'(up to {summary["worst"]} in one) from {where}'
+                + (f', template {template}' if template else '')
+            ))
+            self.stdout.write(f'  {shape}')
+            self.stdout.write(f'  seen in: {", ".join(sorted(summary["labels"])[:5])}')
+        if len(ranked) > options['limit']:
+            self.stdout.write(f'... and {len(ranked) - options["limit"]} more')
+
+        if options['clear']:
+            os.remove(path)
+        if options['fail']:
+            raise CommandError(f'{len(ranked)} repeated query patterns recorded.')
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import deliver_batch, get_config
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox in batches over one connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Emails sent per connection (default: EMAIL_OUTBOX["BATCH_SIZE"])',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to wait between polls when the outbox is empty (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or get_config()['BATCH_SIZE']
+        total_sent = total_failed = 0
+
+        try:
+            while True:
+                sent, failed = deliver_batch(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+                # Nothing got through, e.g. the mail server is down: wait
+                # instead of failing every due entry in quick succession
+                if sent + failed < batch_size or not sent:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Outbox drained: {total_sent} sent, {total_failed} failed'
+        ))
@@ -0,0 +1,40 @@
+import base64
+import hashlib
+import os
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.assets import VENDOR_ASSETS
+
+
+class Command(BaseCommand):
+    help = 'Download third-party static assets into static/vendor, verifying their SRI hashes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Download files that are already vendored again',
+        )
+
+    def handle(self, *args, **options):
+        static_dir = settings.STATICFILES_DIRS[0]
+        for name, (path, url, integrity) in VENDOR_ASSETS.items():
+            target = os.path.join(static_dir, path)
+            if os.path.exists(target) and not options['force']:
+                self.stdout.write(f'{name}: already vendored')
+                continue
+
+            with urlopen(url, timeout=30) as response:
+                data = response.read()
+
+            algorithm, _, expected = integrity.partition('-')
+            actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+            if actual != expected:
+                raise CommandError(f'{name}: {url} does not match {integrity}.')
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            self.stdout.write(self.style.SUCCESS(f'{name}: saved {path} ({len(data)} bytes)'))
@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from . import instrumentation, query_audit
+from .account import load_account
+from .hash_pool import HashPoolBusy
+
+
+class AccountMiddleware(MiddlewareMixin):
+    """
+    Expose the user's profile and role as request.account.
+
+    Loaded lazily on first access and at most once per request, so views,
+    decorators and templates share one lookup.
+    """
+
+    def process_request(self, request):
+        request.account = SimpleLazyObject(lambda: load_account(request))
+
+
+class HashPoolBusyMiddleware(MiddlewareMixin):
+    """Answer 503 instead of queueing when the password hashing pool is saturated"""
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashPoolBusy):
+            response = HttpResponse(
+                'The server is busy. Please try again in a moment.',
+                status=503,
+                content_type='text/plain',
+            )
+            response['Retry-After'] = '1'
+            return response
+        return None
+
+
+class SessionRefreshMiddleware(MiddlewareMixin):
+    """
+    Slide session expiry forward at most once every SESSION_REFRESH_INTERVAL seconds.
+
+    A replacement for SESSION_SAVE_EVERY_REQUEST, which writes the session
+    on every request. Sessions the request did not touch are left alone, so
+    anonymous traffic never creates one. Must sit below SessionMiddleware.
+    """
+    REFRESHED_KEY = '_session_refreshed_at'
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        interval = getattr(settings, 'SESSION_REFRESH_INTERVAL', 300)
+        if session is None or not interval or not session.accessed or session.is_empty():
+            return response
+
+        now = int(time.time())
+        if session.modified or now - session.get(self.REFRESHED_KEY, 0) >= interval:
+            # Marks the session modified, so SessionMiddleware saves it with a new expiry
+            session[self.REFRESHED_KEY] = now
+        return response
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """
+    Record per-view metrics for every request when REQUEST_METRICS['ENABLED'].
+
+    Goes first in MIDDLEWARE so the wall time covers the whole stack. When
+    metrics are off Django drops the middleware at startup.
+    """
+
+    def __init__(self, get_response):
+        config = instrumentation.get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.server_timing = config['SERVER_TIMING']
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request.request_timings = instrumentation.start_request()
+
+    def process_response(self, request, response):
+        timings = getattr(request, 'request_timings', None)
+        if timings is None:
+            return response
+        instrumentation.finish_request()
+        duration = instrumentation.record(request, timings)
+        if self.server_timing:
+            response['Server-Timing'] = instrumentation.server_timing(timings, duration)
+        return response
+
+
+class QueryAuditMiddleware(MiddlewareMixin):
+    """
+    Check each request for repeated query shapes when QUERY_AUDIT['ENABLED'].
+
+    See accounts.query_audit. Dropped at startup when the audit is off.
+    """
+
+    def __init__(self, get_response):
+        if not query_audit.get_config()['ENABLED']:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request.query_log = query_audit.start(f'{request.method} {request.path}')
+
+    def process_response(self, request, response):
+        log = getattr(request, 'query_log', None)
+        if log is None:
+            return response
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            log.label = f'{log.label} ({match.view_name})'
+        query_audit.finish(log)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user on (date_joined, id) for the keyset-paginated user
+    listings. auth.User belongs to django.contrib.auth, so the index is
+    created with raw SQL from this app.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('accounts', '0003_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS accounts_user_joined_id_idx ON auth_user (date_joined, id);',
+            reverse_sql='DROP INDEX IF EXISTS accounts_user_joined_id_idx;',
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Enforce case-insensitive unique, non-empty emails on auth_user.
+
+    auth.User belongs to django.contrib.auth, so the functional index is
+    created with raw SQL from this app. Empty emails map to NULL, which
+    unique indexes never treat as duplicates. Lookups go through
+    accounts.credentials.filter_by_email, which compares the same
+    expression so the planner can use the index. Applying this fails if the table already holds emails that
+    differ only by case; merge those accounts first.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('accounts', '0005_accounts_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE UNIQUE INDEX IF NOT EXISTS accounts_user_email_ci_uniq "
+                "ON auth_user (LOWER(NULLIF(email, '')));"
+            ),
+            reverse_sql='DROP INDEX IF EXISTS accounts_user_email_ci_uniq;',
+        ),
+    ]
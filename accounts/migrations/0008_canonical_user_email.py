@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def canonicalize_emails(apps, schema_editor):
+    """Lowercase stored emails with Python, as accounts.credentials.canonical_email does"""
+    User = apps.get_model('auth', 'User')
+    for pk, email in User.objects.exclude(email='').values_list('pk', 'email').iterator():
+        if email != email.lower():
+            User.objects.filter(pk=pk).update(email=email.lower())
+
+
+class Migration(migrations.Migration):
+    """
+    Store every email in canonical (Python-lowercased) form.
+
+    SQLite's LOWER() folds only ASCII, so an address saved with non-ASCII
+    capitals would escape both the email index of migration 0006 and
+    lookups. Applying this fails if two emails differ only by non-ASCII
+    case; merge those accounts first.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('accounts', '0007_profile_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Enforce case-insensitive unique usernames on auth_user.
+
+    Matches the check UserCreationForm makes, so a sign-up that races past
+    validation with a case variant of a taken name fails on insert instead
+    of creating a look-alike account. accounts.registration.find_conflicts
+    compares the same expression. Applying this fails if the table already
+    holds usernames that differ only by case; rename those first.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('accounts', '0008_canonical_user_email'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE UNIQUE INDEX IF NOT EXISTS accounts_user_username_ci_uniq ON auth_user (LOWER(username));',
+            reverse_sql='DROP INDEX IF EXISTS accounts_user_username_ci_uniq;',
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import EmailValidator
+from django.utils import timezone
 
 
 class UserRole(models.Model):
@@ -34,6 +35,8 @@ class UserProfile(models.Model):
     role = models.ForeignKey(UserRole, on_delete=models.SET_NULL, null=True, related_name='users')
     bio = models.TextField(blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Content hash naming the processed thumbnails; empty while an upload is pending
+    avatar_hash = models.CharField(max_length=64, blank=True, editable=False)
     phone_number = models.CharField(max_length=20, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     is_email_verified = models.BooleanField(default=False)
@@ -52,12 +55,56 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = "User Profile"
         verbose_name_plural = "User Profiles"
+        indexes = [
+            # Admin list filters and default date drill-down
+            models.Index(fields=['role', '-created_at'], name='profile_role_created_idx'),
+            models.Index(fields=['is_email_verified', '-created_at'], name='profile_verified_created_idx'),
+            models.Index(fields=['-created_at'], name='profile_created_idx'),
+        ]
 
     def has_permission(self, permission_name):
         """Check if user has a specific permission"""
-        if not self.role:
-            return False
-        return getattr(self.role, f'can_{permission_name}', False)
+        from .roles import has_permission
+        return has_permission(self.role_id, permission_name)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _tracked_value(self, field):
+        return field.get_prep_value(getattr(self, field.attname))
+
+    def _snapshot_fields(self, fields=None):
+        """Remember field values as loaded or saved, for get_dirty_fields()"""
+        if not hasattr(self, '_loaded_values'):
+            self._loaded_values = {}
+        deferred = self.get_deferred_fields()
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                self._loaded_values[field.attname] = self._tracked_value(field)
+
+    def get_dirty_fields(self):
+        """Names of fields changed since the row was loaded or last saved"""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and self._tracked_value(field) != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        # Saving a loaded profile without update_fields writes only the
+        # changed columns, and nothing at all when nothing changed
+        if not self._state.adding and kwargs.get('update_fields') is None and hasattr(self, '_loaded_values'):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + ['updated_at']
+        super().save(*args, **kwargs)
+        self._snapshot_fields(kwargs.get('update_fields'))
 
 
 class PasswordResetToken(models.Model):
@@ -74,3 +121,53 @@ class PasswordResetToken(models.Model):
     class Meta:
         verbose_name = "Password Reset Token"
         verbose_name_plural = "Password Reset Tokens"
+        indexes = [
+            # Only unused tokens are ever looked up, so keep the indexes small
+            models.Index(
+                fields=['token', 'expires_at'],
+                condition=models.Q(is_used=False),
+                name='reset_token_unused_idx',
+            ),
+            models.Index(
+                fields=['user'],
+                condition=models.Q(is_used=False),
+                name='reset_user_unused_idx',
+            ),
+            models.Index(fields=['user', 'is_used'], name='reset_user_used_idx'),
+        ]
+
+
+class EmailOutbox(models.Model):
+    """Queued outgoing email, delivered in batches by the send_outbox command"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead Letter'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField(help_text='Comma-separated list of addresses')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipients}"
+
+    class Meta:
+        verbose_name = "Email Outbox Entry"
+        verbose_name_plural = "Email Outbox"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def get_recipients(self):
+        return [address for address in self.recipients.split(',') if address]
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import EmailOutbox
+
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_DELAY': 60,
+    'LEASE': 300,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'EMAIL_OUTBOX', {}))
+    return config
+
+
+@retry_on_lock
+def enqueue(subject, body, recipients, from_email=None):
+    """Queue an email for background delivery; costs one INSERT"""
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=','.join(recipients),
+    )
+
+
+@retry_on_lock
+def enqueue_many(messages, from_email=None):
+    """Queue (subject, body, recipients) tuples with one bulk INSERT"""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(subject=subject, body=body, from_email=from_email, recipients=','.join(recipients))
+        for subject, body, recipients in messages
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    return timedelta(seconds=get_config()['RETRY_BASE_DELAY'] * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to batch_size due entries to this worker.
+
+    Leased entries are pushed out of the due window so a concurrent worker
+    does not pick them up; a crashed worker's lease simply expires.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=get_config()['LEASE'])
+    with transaction.atomic():
+        due = (
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')
+        )
+        entries = list(due[:batch_size])
+        EmailOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            next_attempt_at=now + lease
+        )
+    return entries
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Send one batch of due entries over a single mail connection.
+
+    Each message is sent individually on the open connection so one bad
+    recipient does not fail the whole batch. Failures are retried with
+    exponential backoff and dead-lettered after MAX_ATTEMPTS; when the
+    connection cannot be opened, every claimed entry counts as failed.
+    Returns a (sent, failed) tuple.
+    """
+    config = get_config()
+    entries = claim_batch(batch_size or config['BATCH_SIZE'])
+    if not entries:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for entry in entries:
+            _record_failure(entry, exc, config)
+        return 0, len(entries)
+
+    sent_ids = []
+    failed = 0
+    try:
+        for entry in entries:
+            message = EmailMessage(
+                entry.subject,
+                entry.body,
+                entry.from_email,
+                entry.get_recipients(),
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as exc:
+                failed += 1
+                _record_failure(entry, exc, config)
+            else:
+                sent_ids.append(entry.pk)
+    finally:
+        connection.close()
+
+    EmailOutbox.objects.filter(pk__in=sent_ids).update(
+        status=EmailOutbox.STATUS_SENT,
+        sent_at=timezone.now(),
+        last_error='',
+    )
+    return len(sent_ids), failed
+
+
+def _record_failure(entry, exc, config):
+    attempts = entry.attempts + 1
+    update = {'attempts': attempts, 'last_error': f'{type(exc).__name__}: {exc}'}
+    if attempts >= config['MAX_ATTEMPTS']:
+        update['status'] = EmailOutbox.STATUS_DEAD
+    else:
+        update['next_attempt_at'] = timezone.now() + retry_delay(attempts)
+    EmailOutbox.objects.filter(pk=entry.pk).update(**update)
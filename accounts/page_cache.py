@@ -0,0 +1,148 @@
+"""
+Cached page shells for anonymous visitors.
+
+The home, login and registration pages look the same for every anonymous
+visitor apart from the CSRF token and flash messages. The page is
+rendered once with markers in their place, stored in the cache, and each
+request only substitutes its own token and messages into the cached HTML.
+
+Cache keys include a deploy version, so a release with changed templates
+starts from empty shells; clear_page_cache drops individual templates.
+"""
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template import engines
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import instrumentation
+
+
+CSRF_MARKER = 'page-shell-csrf-token'
+MESSAGES_MARKER_RE = re.compile(r'<!--page-shell:messages:([^>]+?)-->')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'CACHE': 'default',
+    'TIMEOUT': 24 * 60 * 60,
+    'VERSION': None,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PAGE_CACHE', {}))
+    return config
+
+
+@lru_cache(maxsize=None)
+def get_deploy_version():
+    """
+    PAGE_CACHE['VERSION'] if set, else a digest of the path, size and mtime
+    of every file in the project and app template directories, so deploying
+    changed templates changes the keys.
+    """
+    version = get_config()['VERSION']
+    if version:
+        return str(version)
+
+    digest = hashlib.sha1()
+    for directory in _template_dirs():
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()[:12]
+
+
+def _template_dirs():
+    """Directories the template loaders search, app template dirs included"""
+    dirs = []
+    for engine in engines.all():
+        loaders = getattr(getattr(engine, 'engine', None), 'template_loaders', None)
+        if loaders is None:
+            dirs.extend(engine.template_dirs)
+            continue
+        # Ask the loaders, since app_directories can be listed without APP_DIRS
+        for loader in loaders:
+            if hasattr(loader, 'get_dirs'):
+                dirs.extend(loader.get_dirs())
+    return list(dict.fromkeys(str(d) for d in dirs))
+
+
+def cache_key(template_name):
+    return f'accounts:page-shell:{get_deploy_version()}:{template_name}'
+
+
+def _cache():
+    return caches[get_config()['CACHE']]
+
+
+def invalidate(template_name):
+    """Drop the cached shell of one template"""
+    _cache().delete(cache_key(template_name))
+
+
+def messages_marker(template_name):
+    """Placeholder the {% messages_block %} tag leaves in a shell"""
+    return f'<!--page-shell:messages:{template_name}-->'
+
+
+def _build_shell(request, template_name, context):
+    shell_context = dict(context)
+    shell_context.update({'csrf_token': CSRF_MARKER, 'page_shell': True})
+    return render_to_string(template_name, shell_context, request=request)
+
+
+def _fill_messages(request, shell):
+    if not get_messages(request):
+        return MESSAGES_MARKER_RE.sub('', shell)
+    return MESSAGES_MARKER_RE.sub(
+        lambda match: render_to_string(match.group(1), request=request), shell
+    )
+
+
+def render_shell(request, template_name, get_context=dict):
+    """
+    Render template_name for an anonymous request from its cached shell.
+
+    get_context is only called when the shell has to be rendered, so the
+    forms and querysets behind it cost nothing on a cache hit. Falls back
+    to a normal render for authenticated users or when PAGE_CACHE is off.
+    The shell must not depend on the request beyond the CSRF token and
+    messages.
+    """
+    if not get_config()['ENABLED'] or request.user.is_authenticated:
+        return render(request, template_name, get_context())
+
+    cache = _cache()
+    key = cache_key(template_name)
+    shell = cache.get(key)
+    instrumentation.record_cache(shell is not None)
+    if shell is None:
+        shell = _build_shell(request, template_name, get_context())
+        cache.set(key, shell, get_config()['TIMEOUT'])
+
+    html = _fill_messages(request, shell.replace(CSRF_MARKER, get_token(request)))
+    response = HttpResponse(html)
+    # The page carries a per-visitor CSRF token
+    patch_cache_control(response, private=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def shell_view(template_name):
+    """A view serving template_name through render_shell"""
+    def view(request):
+        return render_shell(request, template_name)
+    return view
@@ -0,0 +1,156 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import instrumentation
+from .roles import registry
+
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+COUNTS_CACHE_KEY = 'accounts:user-counts'
+COUNTS_CACHE_TIMEOUT = 60
+
+# Largest primary key a 64-bit integer column can hold
+MAX_PK = 2 ** 63 - 1
+
+# Columns the user listings render; everything else stays in the database
+LISTING_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'date_joined',
+    'profile__id', 'profile__role__role_name',
+)
+
+
+def encode_cursor(user):
+    raw = f'{user.date_joined.isoformat()}|{user.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (date_joined, id) pair in a cursor, or None if it is invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        joined, pk = raw.rsplit('|', 1)
+        joined, pk = datetime.fromisoformat(joined), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    # A pk the database cannot bind would fail the query with OverflowError
+    if not 0 <= pk <= MAX_PK:
+        return None
+    return joined, pk
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, object_list, params, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _query(self, key, user):
+        params = self._params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[key] = encode_cursor(user)
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query('after', self.object_list[-1]) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query('before', self.object_list[0]) if self.has_previous else ''
+
+
+def filter_users(params, users=None):
+    """
+    Users matching the listing filters, narrowing users if given.
+
+    role and active filter on indexed columns. q is a username prefix; on
+    SQLite it compiles to a case-insensitive LIKE, which cannot use the
+    username index, so it is checked row by row within the other filters.
+    """
+    if users is None:
+        users = User.objects.select_related('profile__role').only(*LISTING_FIELDS)
+
+    role_name = params.get('role')
+    if role_name:
+        role = registry.get_by_name(role_name)
+        users = users.filter(profile__role_id=role.pk) if role else users.none()
+
+    active = params.get('active')
+    if active in ('0', '1'):
+        users = users.filter(is_active=active == '1')
+
+    search = params.get('q', '').strip()
+    if search:
+        users = users.filter(username__startswith=search)
+
+    return users
+
+
+def paginate_users(users, params, page_size=None):
+    """
+    Seek-paginate users newest first on (date_joined, id).
+
+    Pages are addressed by the row they start after (or end before), so
+    every page costs one indexed range scan of page_size + 1 rows no matter
+    how deep it is.
+    """
+    if page_size is None:
+        try:
+            page_size = int(params.get('per_page', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            page_size = DEFAULT_PAGE_SIZE
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    after = decode_cursor(params.get('after', ''))
+    before = decode_cursor(params.get('before', ''))
+
+    if before is not None:
+        joined, pk = before
+        rows = list(
+            users.filter(Q(date_joined__gt=joined) | Q(date_joined=joined, pk__gt=pk))
+            .order_by('date_joined', 'pk')[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        object_list = rows[:page_size][::-1]
+        return KeysetPage(object_list, params, has_next=True, has_previous=has_previous)
+
+    if after is not None:
+        joined, pk = after
+        users = users.filter(Q(date_joined__lt=joined) | Q(date_joined=joined, pk__lt=pk))
+
+    rows = list(users.order_by('-date_joined', '-pk')[:page_size + 1])
+    return KeysetPage(rows[:page_size], params, has_next=len(rows) > page_size, has_previous=after is not None)
+
+
+def get_user_counts():
+    """
+    Total, admin and regular user counts for the admin dashboard.
+
+    Counting scans the whole table, so the result is cached for
+    COUNTS_CACHE_TIMEOUT seconds instead of being recomputed on every hit.
+    """
+    counts = cache.get(COUNTS_CACHE_KEY)
+    instrumentation.record_cache(counts is not None)
+    if counts is None:
+        admin_role = registry.get_by_name('admin')
+        total = User.objects.count()
+        admins = User.objects.filter(profile__role_id=admin_role.pk).count() if admin_role else 0
+        counts = {'total_users': total, 'admin_users': admins, 'regular_users': total - admins}
+        cache.set(COUNTS_CACHE_KEY, counts, COUNTS_CACHE_TIMEOUT)
+    return counts
@@ -0,0 +1,259 @@
+"""
+Bulk user provisioning for the import_users command.
+
+Rows are validated a chunk at a time against each other and against the
+database (one query per chunk for usernames and one for emails), then the
+users and their profiles are inserted with bulk_create in one transaction.
+bulk_create sends no post_save signals, so sync_user_profile never runs
+and the default role is resolved once per import instead of once per user.
+
+seed_users fills a database with synthetic users for benchmarks the same
+way, sharing a single password hash between them.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.urls import reverse
+
+from . import hash_pool, outbox, reset_tokens
+from .credentials import canonical_email, email_key
+from .models import UserProfile
+from .roles import get_default_role_id, registry
+
+
+FORMATS = ('csv', 'jsonl')
+
+INVITE_SUBJECT = 'Your account is ready'
+
+
+def detect_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_records(stream, fmt):
+    """Yield one dict per input record without reading the whole file"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            record = {'_error': f'Invalid JSON: {exc}'}
+        yield record if isinstance(record, dict) else {'_error': 'Expected a JSON object'}
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _string(record, key):
+    """record[key] if it is a string, '' if missing; JSON numbers, lists and the like are rejected"""
+    value = record.get(key)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValidationError(f'"{key}" must be a string.')
+    return value
+
+
+def _clean(record, key):
+    return _string(record, key).strip()
+
+
+class Importer:
+    """Validates and inserts chunks of user records"""
+
+    def __init__(self, executor=None, invite_base_url=None):
+        self.executor = executor
+        self.invite_base_url = invite_base_url.rstrip('/') if invite_base_url else None
+        self.default_role_id = get_default_role_id()
+
+    def validate(self, records, first_number):
+        """
+        Split a chunk into clean rows and (record number, message) errors.
+
+        Usernames and emails are checked against each other and against
+        existing users with one query each.
+        """
+        rows, errors = [], []
+        usernames, emails = set(), set()
+
+        for number, record in enumerate(records, first_number):
+            if '_error' in record:
+                errors.append((number, record['_error']))
+                continue
+            try:
+                row = self._clean_record(record)
+            except ValidationError as exc:
+                errors.append((number, '; '.join(exc.messages)))
+                continue
+            if row['username'] in usernames:
+                errors.append((number, f'Duplicate username "{row["username"]}" in input.'))
+                continue
+            email = row['email']
+            if email and email in emails:
+                errors.append((number, f'Duplicate email "{row["email"]}" in input.'))
+                continue
+            usernames.add(row['username'])
+            if email:
+                emails.add(email)
+            rows.append((number, row))
+
+        taken_usernames = set(
+            User.objects.filter(username__in=usernames).values_list('username', flat=True)
+        )
+        taken_emails = set(
+            User.objects.annotate(email_key=email_key())
+            .filter(email_key__in=emails)
+            .values_list('email_key', flat=True)
+        ) if emails else set()
+
+        clean = []
+        for number, row in rows:
+            if row['username'] in taken_usernames:
+                errors.append((number, f'Username "{row["username"]}" already exists.'))
+            elif row['email'] and row['email'] in taken_emails:
+                errors.append((number, f'Email "{row["email"]}" is already registered.'))
+            else:
+                clean.append(row)
+        return clean, sorted(errors)
+
+    def _clean_record(self, record):
+        username = _clean(record, 'username')
+        if not username:
+            raise ValidationError('Username is required.')
+        User.username_validator(username)
+        if len(username) > 150:
+            raise ValidationError('Username is longer than 150 characters.')
+
+        email = canonical_email(_clean(record, 'email'))
+        if email:
+            validate_email(email)
+
+        role_id = self.default_role_id
+        role_name = _clean(record, 'role')
+        if role_name:
+            role = registry.get_by_name(role_name)
+            if role is None:
+                raise ValidationError(f'Unknown role "{role_name}".')
+            role_id = role.pk
+
+        return {
+            'username': username,
+            'email': email,
+            'first_name': _clean(record, 'first_name')[:150],
+            'last_name': _clean(record, 'last_name')[:150],
+            'password': _string(record, 'password') or None,
+            'phone_number': _clean(record, 'phone_number')[:20],
+            'bio': _clean(record, 'bio'),
+            'role_id': role_id,
+        }
+
+    def hash_passwords(self, rows):
+        """
+        Encoded passwords for rows, hashed on the executor when there is one.
+
+        Rows without a password get an unusable one, which costs no hashing.
+        """
+        given = [row['password'] for row in rows if row['password']]
+        hashed = iter(hash_pool.make_passwords(given, self.executor))
+        return [next(hashed) if row['password'] else make_password(None) for row in rows]
+
+    def insert(self, rows):
+        """Create users, profiles and invites for clean rows in one transaction"""
+        if not rows:
+            return []
+        passwords = self.hash_passwords(rows)
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=row['username'],
+                    email=row['email'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    password=password,
+                )
+                for row, password in zip(rows, passwords)
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user=user,
+                    role_id=row['role_id'],
+                    phone_number=row['phone_number'],
+                    bio=row['bio'],
+                )
+                for user, row in zip(users, rows)
+            ])
+            if self.invite_base_url:
+                outbox.enqueue_many([
+                    self._invite(user) for user, row in zip(users, rows)
+                    if user.email and not row['password']
+                ])
+        return users
+
+    def _invite(self, user):
+        path = reverse('accounts:password_reset_confirm', kwargs={'token': reset_tokens.make_token(user)})
+        body = f"""
+    Hello {user.first_name or user.username},
+
+    An account has been created for you with the username "{user.username}".
+    Choose your password by following the link below:
+
+    {self.invite_base_url}{path}
+
+    Best regards,
+    Authentication System
+    """
+        return INVITE_SUBJECT, body, [user.email]
+
+
+def seed_username(prefix, number):
+    return f'{prefix}-{number:07d}'
+
+
+def seed_users(count, password, prefix='bench', batch_size=5000, progress=None):
+    """
+    Make sure users prefix-0000000 up to count - 1 exist, adding the missing
+    ones a batch per transaction, and return how many were created.
+
+    The password is hashed once and the encoded value reused, so a million
+    users take as long as the inserts. progress is called with the number
+    of seeded users after each batch.
+    """
+    existing = User.objects.filter(username__startswith=f'{prefix}-').count()
+    if existing >= count:
+        return 0
+
+    encoded = make_password(password)
+    role_id = get_default_role_id()
+    for start in range(existing, count, batch_size):
+        stop = min(count, start + batch_size)
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=seed_username(prefix, number),
+                    email=canonical_email(f'{seed_username(prefix, number)}@example.com'),
+                    password=encoded,
+                )
+                for number in range(start, stop)
+            ])
+            UserProfile.objects.bulk_create([UserProfile(user=user, role_id=role_id) for user in users])
+        if progress:
+            progress(stop)
+    return count - existing
@@ -0,0 +1,216 @@
+"""
+Opt-in N+1 query detection.
+
+While QUERY_AUDIT is enabled, every SQL statement a request runs is
+reduced to its shape (literals, placeholders and IN lists collapsed) and
+counted. A shape that runs more than THRESHOLD times in one request is
+almost always a query issued from a loop: it is logged with the line in
+the project's code, and the template line if one was rendering, that
+issued it. Offenders are appended to REPORT_PATH for the query_report
+command to summarise after a test run, and with RAISE the request fails
+with RepeatedQueries so the test that triggered it does too.
+
+audit() applies the same checks to a block of code outside a request.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD': 5,
+    'RAISE': False,
+    'REPORT_PATH': None,
+    'STACK_DEPTH': 8,
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class RepeatedQueries(Exception):
+    """Raised when QUERY_AUDIT['RAISE'] is on and a request repeats a query shape"""
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'QUERY_AUDIT', {}))
+    return config
+
+
+def normalize(sql):
+    """The shape of a statement: the same query with any parameters"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+# Plumbing every query passes through, left out of the reported stack
+_SKIPPED_MODULES = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('query_audit.py', 'instrumentation.py', 'middleware.py')
+}
+
+
+def _is_project_file(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename not in _SKIPPED_MODULES
+    )
+
+
+def find_origin(depth):
+    """
+    Where the current query comes from: the innermost project frames as
+    'path:line in function' strings, and the template line being rendered.
+    """
+    base = str(settings.BASE_DIR) + os.sep
+    stack, template = [], None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if template is None and code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name or origin.name}:{token.lineno}'
+        if len(stack) < depth and _is_project_file(code.co_filename):
+            path = code.co_filename[len(base):]
+            stack.append(f'{path}:{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return {'stack': stack, 'template': template}
+
+
+class QueryLog:
+    """Query shapes seen by one request or audit() block"""
+
+    def __init__(self, label, threshold, depth, parent=None):
+        self.label = label
+        self.threshold = threshold
+        self.depth = depth
+        # The log of an enclosing request or audit(), which sees the queries too
+        self.parent = parent
+        self.counts = {}
+        self.origins = {}
+
+    def add(self, sql):
+        shape = normalize(sql)
+        count = self.counts.get(shape, 0) + 1
+        self.counts[shape] = count
+        if count == self.threshold + 1:
+            # The query that crosses the threshold comes from the loop
+            self.origins[shape] = find_origin(self.depth)
+
+    def offenders(self):
+        """Shapes run more than THRESHOLD times, most repeated first"""
+        return sorted(
+            (
+                {'label': self.label, 'shape': shape, 'count': count, **self.origins[shape]}
+                for shape, count in self.counts.items() if count > self.threshold
+            ),
+            key=lambda offender: -offender['count'],
+        )
+
+
+_current = ContextVar('accounts_query_log', default=None)
+_report_lock = threading.Lock()
+
+
+def log_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current QueryLog"""
+    log = _current.get()
+    while log is not None:
+        log.add(sql)
+        log = log.parent
+    return execute(sql, params, many, context)
+
+
+def install_query_log(sender, connection, **kwargs):
+    """connection_created handler wrapping every new connection with log_query"""
+    if log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_query)
+
+
+def start(label):
+    config = get_config()
+    log = QueryLog(label, config['THRESHOLD'], config['STACK_DEPTH'])
+    _current.set(log)
+    return log
+
+
+def finish(log):
+    """
+    Stop collecting, then log, record and (with RAISE) raise for the
+    shapes log repeated too often.
+    """
+    _current.set(None)
+    return report(log)
+
+
+def report(log, raise_errors=True):
+    """Log and record the shapes log repeated too often, raising with RAISE and raise_errors"""
+    offenders = log.offenders()
+    if not offenders:
+        return []
+
+    config = get_config()
+    for offender in offenders:
+        logger.warning(
+            '%s ran the same query %d times (template %s):\n  %s\n  %s',
+            offender['label'], offender['count'], offender['template'] or '-',
+            offender['shape'], '\n  '.join(offender['stack']) or '<no project frames>',
+        )
+    if config['REPORT_PATH']:
+        with _report_lock, open(config['REPORT_PATH'], 'a') as f:
+            for offender in offenders:
+                f.write(json.dumps(offender) + '\n')
+    if config['RAISE'] and raise_errors:
+        worst = offenders[0]
+        where = worst['stack'][0] if worst['stack'] else worst['template'] or 'unknown code'
+        raise RepeatedQueries(
+            f'{worst["label"]} ran the same query {worst["count"]} times from {where}: {worst["shape"]}'
+        )
+    return offenders
+
+
+@contextmanager
+def audit(label='audit'):
+    """
+    Check the queries run on the default connection by a block, e.g. in a
+    test or a shell session, whether or not QUERY_AUDIT is enabled.
+
+    Nests inside a request or another audit(): the enclosing log sees the
+    block's queries as well and is collecting again afterwards. A block that
+    raises is still reported, but its exception is not replaced by
+    RepeatedQueries.
+    """
+    install_query_log(None, connection)
+    config = get_config()
+    log = QueryLog(label, config['THRESHOLD'], config['STACK_DEPTH'], parent=_current.get())
+    token = _current.set(log)
+    try:
+        yield log
+    except BaseException:
+        _current.reset(token)
+        report(log, raise_errors=False)
+        raise
+    _current.reset(token)
+    report(log)
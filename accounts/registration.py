@@ -0,0 +1,69 @@
+"""
+Self-service registration.
+
+Username and email availability is checked with a single query, and the
+user and its profile are inserted in one transaction. The database's
+unique constraints remain the final word: a sign-up that loses a race
+after validation gets the same field errors instead of a server error.
+"""
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+
+from .credentials import canonical_email, email_key
+from .db import retry_on_lock
+
+
+USERNAME_TAKEN = 'This username is already taken.'
+EMAIL_TAKEN = 'This email address is already registered.'
+
+
+def find_conflicts(username, email):
+    """
+    {field: message} for a username or email already in use, ignoring case.
+
+    Both are checked in one query that the case-insensitive username and
+    email indexes answer directly. The username is lowered by the database
+    on both sides, as migration 0009's index does.
+    """
+    email = canonical_email(email)
+    condition = Q(username_key=Lower(Value(username)))
+    if email:
+        condition |= Q(email_key=email)
+    taken = (
+        User.objects.annotate(username_key=Lower('username'), email_key=email_key())
+        .filter(condition)
+        .values_list('username', 'email_key')[:2]
+    )
+
+    conflicts = {}
+    for taken_username, taken_email in taken:
+        if taken_username.lower() == username.lower():
+            conflicts['username'] = USERNAME_TAKEN
+        if email and taken_email == email:
+            conflicts['email'] = EMAIL_TAKEN
+    return conflicts
+
+
+@retry_on_lock
+def create_user(user):
+    """
+    Insert a new user and, through sync_user_profile, its profile in one
+    transaction.
+
+    The unique constraints settle races with concurrent sign-ups: if one
+    wins between validation and insert, the conflict is reported as a
+    ValidationError keyed by field.
+    """
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        user.pk = None
+        conflicts = find_conflicts(user.username, user.email)
+        if not conflicts:
+            raise
+        raise ValidationError(conflicts)
+    return user
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.module_loading import import_string
+
+from .models import PasswordResetToken
+
+
+class SignedTokenGenerator(PasswordResetTokenGenerator):
+    """
+    HMAC over the user's pk, password hash, last_login and a timestamp.
+
+    Changing the password or logging in alters the hash input, so a token
+    stops working after it is used without anything being stored.
+    """
+    key_salt = 'accounts.reset_tokens.SignedTokenGenerator'
+
+
+class SignedTokenBackend:
+    """
+    Stateless reset tokens of the form <uidb64>.<timestamp>-<hmac>.
+
+    Checking a token costs one user fetch by primary key and no writes.
+    """
+    generator = SignedTokenGenerator()
+
+    def make_token(self, user):
+        uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+        return f'{uidb64}.{self.generator.make_token(user)}'
+
+    def get_user(self, token):
+        """User the token was issued to, or None if it is invalid or expired"""
+        uidb64, _, signed = token.partition('.')
+        try:
+            pk = int(force_str(urlsafe_base64_decode(uidb64)))
+            user = User.objects.get(pk=pk)
+        except (TypeError, ValueError, OverflowError, ValidationError, User.DoesNotExist):
+            # Anything a tampered uid can decode to, e.g. a pk too large to bind
+            return None
+        return user if self.generator.check_token(user, signed) else None
+
+    def consume(self, token, user):
+        # The password change has already invalidated the token
+        pass
+
+
+class DatabaseTokenBackend:
+    """
+    Random tokens stored in PasswordResetToken.
+
+    Costs a write per request and per reset but leaves an audit trail of
+    issued and used tokens. Clear old rows with purge_reset_tokens.
+    """
+
+    def make_token(self, user):
+        token = get_random_string(50)
+        PasswordResetToken.objects.filter(user=user, is_used=False).delete()
+        PasswordResetToken.objects.create(
+            user=user,
+            token=token,
+            expires_at=timezone.now() + timedelta(seconds=settings.PASSWORD_RESET_TIMEOUT),
+        )
+        return token
+
+    def get_user(self, token):
+        reset_token = (
+            PasswordResetToken.objects.select_related('user')
+            .filter(token=token, is_used=False, expires_at__gt=timezone.now())
+            .first()
+        )
+        return reset_token.user if reset_token else None
+
+    def consume(self, token, user):
+        PasswordResetToken.objects.filter(token=token, user=user).update(is_used=True)
+
+
+_backends = {}
+
+
+def get_backend():
+    """Instance of the PASSWORD_RESET_TOKEN_BACKEND class"""
+    path = getattr(settings, 'PASSWORD_RESET_TOKEN_BACKEND', 'accounts.reset_tokens.SignedTokenBackend')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def make_token(user):
+    return get_backend().make_token(user)
+
+
+def get_user(token):
+    return get_backend().get_user(token)
+
+
+def consume(token, user):
+    get_backend().consume(token, user)
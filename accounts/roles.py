@@ -0,0 +1,147 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import UserRole
+
+
+# Bit assigned to each UserRole.can_* flag
+PERMISSION_BITS = {
+    'delete_users': 1 << 0,
+    'edit_users': 1 << 1,
+    'view_reports': 1 << 2,
+    'moderate_content': 1 << 3,
+}
+
+VERSION_KEY = 'accounts:roles:version'
+
+
+class RoleInfo:
+    """Immutable snapshot of a UserRole with its permissions compiled to a bitmask"""
+    __slots__ = ('pk', 'role_name', 'permissions')
+
+    def __init__(self, pk, role_name, permissions):
+        self.pk = pk
+        self.role_name = role_name
+        self.permissions = permissions
+
+    @classmethod
+    def from_role(cls, role):
+        permissions = 0
+        for name, bit in PERMISSION_BITS.items():
+            if getattr(role, f'can_{name}'):
+                permissions |= bit
+        return cls(role.pk, role.role_name, permissions)
+
+    def has_permission(self, permission_name):
+        return bool(self.permissions & PERMISSION_BITS.get(permission_name, 0))
+
+    def __repr__(self):
+        return f'<RoleInfo {self.role_name} permissions={self.permissions:#b}>'
+
+
+class RoleRegistry:
+    """
+    In-process cache of every UserRole, loaded in one query.
+
+    Workers agree on freshness through a version token in the shared cache.
+    The token is compared at most once every ROLE_REGISTRY_CHECK_INTERVAL
+    seconds, so most permission checks are a dict lookup and a bit test.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (by_pk, by_name) dicts, replaced as a whole so readers never see
+        # a half-built or missing snapshot
+        self._snapshot = None
+        self._version = None
+        self._stale = True
+        self._checked_at = 0.0
+
+    def clear(self):
+        """Mark the roles stale; the next lookup reloads them"""
+        self._stale = True
+
+    def _cache(self):
+        return caches[getattr(settings, 'ROLE_REGISTRY_CACHE', 'default')]
+
+    def _current_version(self):
+        cache = self._cache()
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            # Another worker may have set it first; use whichever won
+            cache.add(VERSION_KEY, version, timeout=None)
+            version = cache.get(VERSION_KEY, version)
+        return version
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'ROLE_REGISTRY_CHECK_INTERVAL', 5)
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and now - self._checked_at < interval:
+            return snapshot
+
+        with self._lock:
+            version = self._current_version()
+            if self._snapshot is None or self._stale or version != self._version:
+                # Cleared before the query, so a clear() during it forces another load
+                self._stale = False
+                roles = [RoleInfo.from_role(role) for role in UserRole.objects.all()]
+                self._snapshot = (
+                    {role.pk: role for role in roles},
+                    {role.role_name: role for role in roles},
+                )
+                self._version = version
+            self._checked_at = now
+            return self._snapshot
+
+    def get(self, pk):
+        """RoleInfo for a role primary key, or None"""
+        if pk is None:
+            return None
+        by_pk, _ = self._ensure_loaded()
+        return by_pk.get(pk)
+
+    def get_by_name(self, role_name):
+        """RoleInfo for a role name, or None"""
+        _, by_name = self._ensure_loaded()
+        return by_name.get(role_name)
+
+    def invalidate(self):
+        """Publish a new version so every worker reloads its roles"""
+        self._cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        self.clear()
+
+
+registry = RoleRegistry()
+
+
+def get_default_role_id():
+    """Primary key of the default 'user' role, creating it on first use"""
+    role = registry.get_by_name('user')
+    if role is None:
+        user_role, created = UserRole.objects.get_or_create(
+            role_name='user',
+            defaults={
+                'description': 'Regular user with basic permissions'
+            }
+        )
+        if not created:
+            # Created by another worker since our last load
+            registry.clear()
+        return user_role.pk
+    return role.pk
+
+
+def has_permission(role_id, permission_name):
+    role = registry.get(role_id)
+    return role is not None and role.has_permission(permission_name)
+
+
+def has_role(role_id, role_name):
+    role = registry.get(role_id)
+    return role is not None and role.role_name == role_name
@@ -1,33 +1,38 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .credentials import canonical_email
 from .models import UserProfile, UserRole
+from .roles import get_default_role_id, registry
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Create a UserProfile when a new User is created"""
-    if created:
-        # Get or create the default 'user' role
-        user_role, _ = UserRole.objects.get_or_create(
-            role_name='user',
-            defaults={
-                'description': 'Regular user with basic permissions'
-            }
-        )
-        UserProfile.objects.create(user=instance, role=user_role)
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def invalidate_role_registry(sender, **kwargs):
+    """Make every worker reload roles after one is edited in admin"""
+    registry.invalidate()
+
+
+@receiver(pre_save, sender=User)
+def canonicalize_user_email(sender, instance, **kwargs):
+    """Store emails in the form lookups compare against"""
+    instance.email = canonical_email(instance.email)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the UserProfile when the User is saved"""
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        user_role, _ = UserRole.objects.get_or_create(
-            role_name='user',
-            defaults={
-                'description': 'Regular user with basic permissions'
-            }
-        )
-        UserProfile.objects.create(user=instance, role=user_role)
+def sync_user_profile(sender, instance, created, **kwargs):
+    """
+    Create the UserProfile for a new User, and save a profile that was
+    loaded alongside the user only if it has unsaved changes.
+
+    Plain User saves, such as the last_login update on every login, cost
+    no profile query or write.
+    """
+    if created:
+        UserProfile.objects.create(user=instance, role_id=get_default_role_id())
+        return
+
+    if User.profile.related.is_cached(instance):
+        profile = User.profile.related.get_cached_value(instance)
+        if profile is not None and profile.get_dirty_fields():
+            profile.save()
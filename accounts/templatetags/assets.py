@@ -0,0 +1,21 @@
+from django import template
+
+from accounts import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_static(name):
+    """
+    URL of a third-party asset listed in accounts.assets.VENDOR_ASSETS.
+
+    Usage: <link href="{% vendor_static 'bootstrap.css' %}" rel="stylesheet">
+    """
+    return assets.vendor_url(name)
+
+
+@register.simple_tag
+def vendor_integrity(name):
+    """SRI hash of a vendored asset, which holds for the local copy and the CDN alike"""
+    return assets.vendor_integrity(name)
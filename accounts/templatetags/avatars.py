@@ -0,0 +1,19 @@
+from django import template
+
+from accounts.avatars import avatar_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag('accounts/includes/avatar.html')
+def avatar(profile, size='small', css_class='rounded-circle'):
+    """
+    Render a profile's avatar at a named AVATAR['SIZES'] size.
+
+    Usage: {% load avatars %}{% avatar account.profile 'medium' %}
+    """
+    return {
+        'sources': avatar_sources(profile, size),
+        'alt': profile.user.get_username() if profile is not None else '',
+        'css_class': css_class,
+    }
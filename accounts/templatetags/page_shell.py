@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from accounts.page_cache import messages_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def messages_block(context, template_name):
+    """
+    Render flash messages with template_name.
+
+    Inside a cached page shell this leaves a marker instead, which
+    page_cache fills with the visitor's own messages on every request.
+    """
+    if context.get('page_shell'):
+        return mark_safe(messages_marker(template_name))
+    return context.template.engine.get_template(template_name).render(context)
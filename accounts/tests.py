@@ -0,0 +1,991 @@
+import base64
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import Http404, HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+
+from . import assets, async_views, exports, hash_pool, instrumentation, outbox, page_cache, query_audit, throttle
+from .credentials import filter_by_email, resolve_user
+from .forms import PasswordResetRequestForm, UserRegistrationForm
+from .gc import Scheduler, collect_sessions, delete_in_chunks, expired_reset_tokens, start_scheduler
+from .lockout import record_successful_login
+from .middleware import SessionRefreshMiddleware
+from .models import EmailOutbox, PasswordResetToken, UserProfile, UserRole
+from .pagination import decode_cursor, encode_cursor
+from .registration import EMAIL_TAKEN, USERNAME_TAKEN, create_user, find_conflicts
+from .reset_tokens import DatabaseTokenBackend, SignedTokenBackend
+from .roles import registry
+from .views import get_client_ip
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    # Sessions in the cache, so query budgets count only the accounts code
+    SESSION_ENGINE='django.contrib.sessions.backends.cache',
+    STORAGES=dict(settings.STORAGES, staticfiles={
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    }),
+)
+class AccountsTestCase(TestCase):
+    """Starts every test with empty caches and a loaded role registry"""
+
+    password = 'Correct-horse-9'
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', self.password)
+        registry.get_by_name('user')
+
+
+class LoginQueryCountTests(AccountsTestCase):
+    """Query budget of a login POST, so the login path cannot drift back"""
+
+    def login(self, username, password):
+        return self.client.post(reverse('accounts:login'), {'username': username, 'password': password})
+
+    def test_successful_login(self):
+        # User, profile and role in one lookup, then last_login on user and profile
+        with self.assertNumQueries(3):
+            response = self.login('alice', self.password)
+        self.assertRedirects(response, reverse('accounts:dashboard'), fetch_redirect_response=False)
+
+    def test_successful_login_by_email(self):
+        with self.assertNumQueries(3):
+            response = self.login('ALICE@example.com', self.password)
+        self.assertRedirects(response, reverse('accounts:dashboard'), fetch_redirect_response=False)
+
+    def test_wrong_password(self):
+        # The lookup and one conditional UPDATE of the failure counter
+        with self.assertNumQueries(2):
+            response = self.login('alice', 'wrong-password')
+        self.assertEqual(response.status_code, 200)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.login_attempts, 1)
+
+    def test_unknown_user(self):
+        with self.assertNumQueries(1):
+            response = self.login('nobody', self.password)
+        self.assertEqual(response.status_code, 200)
+
+    def test_locked_account(self):
+        self.user.profile.is_locked = True
+        self.user.profile.save()
+        with self.assertNumQueries(1):
+            response = self.login('alice', self.password)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['accounts.hashers.PBKDF2PasswordHasher', 'accounts.hashers.ScryptPasswordHasher'],
+    PASSWORD_HASH_COST={'pbkdf2': {'iterations': 1000}, 'scrypt': {'work_factor': 2 ** 4}},
+)
+class PasswordHashCostTests(AccountsTestCase):
+    def login(self):
+        self.client.post(reverse('accounts:login'), {'username': 'alice', 'password': self.password})
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_cost_comes_from_settings(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_raised_cost_rehashes_on_login(self):
+        with self.settings(PASSWORD_HASH_COST={'pbkdf2': {'iterations': 2000}}):
+            self.assertTrue(self.login().startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password(self.password))
+
+    def test_unchanged_cost_keeps_the_hash(self):
+        encoded = self.user.password
+        self.assertEqual(self.login(), encoded)
+
+    def test_new_algorithm_rehashes_on_login(self):
+        hashers = ['accounts.hashers.ScryptPasswordHasher', 'accounts.hashers.PBKDF2PasswordHasher']
+        with self.settings(PASSWORD_HASHERS=hashers):
+            self.assertTrue(self.login().startswith('scrypt$'))
+
+
+class ProfileSaveTests(AccountsTestCase):
+    """Profiles write only changed columns, and nothing when unchanged"""
+
+    def setUp(self):
+        super().setUp()
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def test_unchanged_save_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self.profile.save()
+
+    def test_changed_save_updates_only_dirty_columns(self):
+        self.profile.bio = 'Hello'
+        with CaptureQueriesContext(connection) as queries:
+            self.profile.save()
+        [query] = queries.captured_queries
+        self.assertIn('"bio"', query['sql'])
+        self.assertIn('"updated_at"', query['sql'])
+        self.assertNotIn('"phone_number"', query['sql'])
+        self.assertEqual(self.profile.get_dirty_fields(), [])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.bio, 'Hello')
+
+    def test_user_save_skips_a_clean_loaded_profile(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_user_save_writes_a_dirty_loaded_profile(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.profile.bio = 'Changed'
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(UserProfile.objects.get(user=self.user).bio, 'Changed')
+
+
+class RegistrationTests(AccountsTestCase):
+    def register(self, username, email):
+        form = UserRegistrationForm({
+            'username': username, 'email': email,
+            'password1': 'Sturdy-pass-42', 'password2': 'Sturdy-pass-42',
+        })
+        if form.is_valid():
+            form.save()
+        return form
+
+    def test_non_ascii_email_is_stored_and_matched_case_insensitively(self):
+        self.assertTrue(self.register('carol', 'carol@MÜNCHEN.de').is_valid())
+        self.assertEqual(User.objects.get(username='carol').email, 'carol@münchen.de')
+        self.assertEqual(resolve_user('carol@MÜNCHEN.de').username, 'carol')
+        self.assertTrue(PasswordResetRequestForm({'email': 'carol@MÜNCHEN.de'}).is_valid())
+
+        form = self.register('carol2', 'carol@münchen.de')
+        self.assertEqual(form.errors['email'], [EMAIL_TAKEN])
+
+    def test_username_is_taken_ignoring_case(self):
+        with self.assertNumQueries(1):
+            form = self.register('ALICE', 'other@example.com')
+        self.assertEqual(form.errors['username'], [USERNAME_TAKEN])
+
+    def test_race_lost_after_validation(self):
+        for username, email, field in (
+            ('bob', 'bob@example.com', 'username'),
+            ('carol', 'carol@example.com', 'email'),
+        ):
+            with self.subTest(field=field):
+                form = UserRegistrationForm({
+                    'username': username, 'email': email,
+                    'password1': 'Sturdy-pass-42', 'password2': 'Sturdy-pass-42',
+                })
+                self.assertTrue(form.is_valid())
+                # A concurrent sign-up commits a case variant in between
+                if field == 'username':
+                    User.objects.create_user(username.upper(), 'elsewhere@example.com')
+                else:
+                    User.objects.create_user(f'{username}2', email.upper())
+                with self.assertRaises(ValidationError) as caught:
+                    form.save()
+                self.assertEqual(caught.exception.message_dict, {
+                    field: [USERNAME_TAKEN if field == 'username' else EMAIL_TAKEN],
+                })
+                self.assertFalse(User.objects.filter(username=username).exists())
+
+    def test_unique_index_rejects_case_variant(self):
+        with self.assertRaises(ValidationError) as caught:
+            create_user(User(username='Alice', email='alice2@example.com'))
+        self.assertEqual(caught.exception.message_dict, {'username': [USERNAME_TAKEN]})
+
+
+class PasswordResetRequestViewTests(AccountsTestCase):
+    def test_renders(self):
+        response = self.client.get(reverse('accounts:password_reset'))
+        self.assertTemplateUsed(response, 'accounts/password_reset.html')
+
+    def test_async_view_renders_the_same_template(self):
+        request = RequestFactory().get(reverse('accounts:password_reset'))
+        request.account = SimpleNamespace(is_authenticated=False)
+        with mock.patch.object(async_views, 'arender') as arender:
+            async_to_sync(async_views.password_reset_request_view)(request)
+        self.assertEqual(arender.call_args[0][1], 'accounts/password_reset.html')
+
+
+class ExportTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        reports = UserRole.objects.create(role_name='analyst', can_view_reports=True)
+        UserProfile.objects.filter(user=self.user).update(role=reports)
+        self.user.first_name = '=HYPERLINK("http://example.com")'
+        self.user.last_name = '-2+3'
+        self.user.save()
+        User.objects.create_user('bob', 'bob@example.com', first_name='Bob', last_name='@home')
+        registry.clear()
+        self.url = reverse('accounts:export_users') + '?format=csv'
+
+    def test_csv_quotes_formula_cells(self):
+        rows = [row[3:5] for row in csv.reader(exports.iter_export('csv'))]
+        self.assertEqual(rows[1:], [
+            ["'=HYPERLINK(\"http://example.com\")", "'-2+3"],
+            ['Bob', "'@home"],
+        ])
+
+    def test_jsonl_is_unchanged(self):
+        first = json.loads(next(exports.iter_export('jsonl')))
+        self.assertEqual(first['first_name'], '=HYPERLINK("http://example.com")')
+
+    def test_wsgi_streams_sync_iterator(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(), ''.join(exports.iter_export('csv')),
+        )
+
+    async def test_asgi_streams_async_iterator(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        expected = await sync_to_async(lambda: ''.join(exports.iter_export('csv')))()
+        self.assertEqual(content, expected)
+
+    def test_async_export_matches_sync_export_in_batches(self):
+        async def collect():
+            return [batch async for batch in exports.aiter_export('jsonl', chunk_size=1)]
+
+        batches = async_to_sync(collect)()
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(''.join(batches), ''.join(exports.iter_export('jsonl')))
+
+
+class PageQueryCountTests(AccountsTestCase):
+    """Query budgets of the logged-in pages, independent of how many users exist"""
+
+    def setUp(self):
+        super().setUp()
+        admin = UserRole.objects.create(
+            role_name='admin', can_delete_users=True, can_edit_users=True, can_view_reports=True,
+        )
+        UserProfile.objects.filter(user=self.user).update(role=admin)
+        for n in range(10):
+            User.objects.create_user(f'user{n}', f'user{n}@example.com', self.password)
+        registry.clear()
+        registry.get_by_name('admin')
+        self.client.force_login(self.user)
+
+    def get(self, name):
+        response = self.client.get(reverse(f'accounts:{name}'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_dashboard(self):
+        # The user with profile and role, loaded once by AccountMiddleware
+        with self.assertNumQueries(1):
+            self.get('dashboard')
+
+    def test_profile(self):
+        with self.assertNumQueries(1):
+            self.get('profile')
+
+    def test_admin_dashboard(self):
+        # The user, one page of users, and the two cached counts on a cold cache
+        with self.assertNumQueries(4):
+            self.get('admin_dashboard')
+        with self.assertNumQueries(2):
+            self.get('admin_dashboard')
+
+    def test_users_list(self):
+        with self.assertNumQueries(2):
+            response = self.get('users_list')
+        self.assertEqual(len(response.context['users']), 11)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(AccountsTestCase):
+    """The login and reset lookups must search an index, never scan a table"""
+
+    def plans(self, func, *args):
+        """Query plan of each statement func runs, in order"""
+        with CaptureQueriesContext(connection) as queries:
+            func(*args)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plans.append([row[-1] for row in cursor.fetchall()])
+        return plans
+
+    def assertNoScan(self, plan):
+        self.assertFalse([step for step in plan if step.startswith('SCAN')], plan)
+
+    def test_resolve_user(self):
+        [plan] = self.plans(resolve_user, 'alice@example.com')
+        self.assertNoScan(plan)
+        self.assertIn('SEARCH auth_user USING INDEX accounts_user_email_ci_uniq (<expr>=?)', plan)
+        self.assertTrue(any('auth_user USING INDEX' in step and '(username=?)' in step for step in plan), plan)
+
+    def test_filter_by_email(self):
+        [plan] = self.plans(lambda: list(filter_by_email(User.objects.all(), 'Alice@Example.com')))
+        self.assertEqual(plan, ['SEARCH auth_user USING INDEX accounts_user_email_ci_uniq (<expr>=?)'])
+
+    def test_find_conflicts(self):
+        [plan] = self.plans(find_conflicts, 'Alice', 'Alice@Example.com')
+        self.assertNoScan(plan)
+        self.assertIn('SEARCH auth_user USING INDEX accounts_user_username_ci_uniq (<expr>=?)', plan)
+        self.assertIn('SEARCH auth_user USING INDEX accounts_user_email_ci_uniq (<expr>=?)', plan)
+
+    def test_reset_token_lookup(self):
+        [plan] = self.plans(DatabaseTokenBackend().get_user, 'x' * 50)
+        self.assertNoScan(plan)
+        self.assertTrue(plan[0].startswith('SEARCH accounts_passwordresettoken USING INDEX'), plan)
+
+    def test_reset_token_issue(self):
+        # Deleting the user's unused tokens, before the INSERT
+        delete_plan = self.plans(DatabaseTokenBackend().make_token, self.user)[0]
+        self.assertNoScan(delete_plan)
+        self.assertRegex(delete_plan[0], r'^SEARCH accounts_passwordresettoken USING (COVERING )?INDEX reset_user_')
+
+
+class SignedTokenTests(AccountsTestCase):
+    def test_round_trip(self):
+        backend = SignedTokenBackend()
+        self.assertEqual(backend.get_user(backend.make_token(self.user)), self.user)
+
+    def test_tampered_uid_is_invalid(self):
+        backend = SignedTokenBackend()
+        signed = backend.make_token(self.user).partition('.')[2]
+        for uid in (str(10 ** 30), '-1', 'abc', ''):
+            with self.subTest(uid=uid):
+                uidb64 = urlsafe_base64_encode(uid.encode())
+                self.assertIsNone(backend.get_user(f'{uidb64}.{signed}'))
+
+
+class PurgeResetTokensTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        later = timezone.now() + timedelta(hours=1)
+        PasswordResetToken.objects.bulk_create([
+            PasswordResetToken(user=self.user, token='used', is_used=True, expires_at=later),
+            PasswordResetToken(user=self.user, token='expired', expires_at=timezone.now() - timedelta(hours=1)),
+            PasswordResetToken(user=self.user, token='live', expires_at=later),
+        ])
+
+    def test_deletes_used_and_expired_in_chunks(self):
+        out = StringIO()
+        with self.assertNumQueries(5):
+            # Two chunks of one row (select pks, delete) and a final empty select
+            call_command('purge_reset_tokens', chunk_size=1, stdout=out)
+        self.assertIn('Deleted 2 password reset tokens', out.getvalue())
+        self.assertQuerySetEqual(PasswordResetToken.objects.values_list('token', flat=True), ['live'])
+
+    def test_all(self):
+        call_command('purge_reset_tokens', all=True, stdout=StringIO())
+        self.assertFalse(PasswordResetToken.objects.exists())
+
+
+class GarbageCollectionTests(AccountsTestCase):
+    def test_chunks_keep_rows_that_do_not_match(self):
+        expired = timezone.now() - timedelta(hours=1)
+        later = timezone.now() + timedelta(hours=1)
+        PasswordResetToken.objects.bulk_create([
+            PasswordResetToken(user=self.user, token=f't{n}', expires_at=later if n % 2 else expired)
+            for n in range(5)
+        ])
+        # The first pk range, t0..t2, spans the live t1, which stays
+        deleted, _ = delete_in_chunks(expired_reset_tokens(), chunk_size=2)
+        self.assertEqual(deleted, 3)
+        self.assertQuerySetEqual(
+            PasswordResetToken.objects.order_by('token').values_list('token', flat=True), ['t1', 't3'],
+        )
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_collect_sessions_deletes_expired_rows(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key='expired', session_data='', expire_date=now - timedelta(days=1)),
+            Session(session_key='live', session_data='', expire_date=now + timedelta(days=1)),
+        ])
+        self.assertEqual(collect_sessions()[0], 1)
+        self.assertQuerySetEqual(Session.objects.values_list('session_key', flat=True), ['live'])
+
+    def test_collect_sessions_defers_to_engines_without_a_table(self):
+        with mock.patch('django.contrib.sessions.backends.cache.SessionStore.clear_expired') as clear_expired:
+            self.assertEqual(collect_sessions()[0], 0)
+        clear_expired.assert_called_once_with()
+
+
+class GarbageCollectionSchedulerTests(SimpleTestCase):
+    def run_scheduler(self, side_effect, runs):
+        done = threading.Event()
+        calls = []
+
+        def collect():
+            calls.append(None)
+            if len(calls) == runs:
+                done.set()
+            return side_effect(len(calls))
+
+        scheduler = Scheduler(0.001)
+        with mock.patch('accounts.gc.collect', collect), mock.patch('accounts.gc.close_old_connections'):
+            scheduler.start()
+            self.assertTrue(done.wait(5))
+            scheduler.stop()
+            scheduler._thread.join(5)
+        self.assertFalse(scheduler._thread.is_alive())
+
+    def test_keeps_running_after_a_failed_pass(self):
+        def side_effect(run):
+            if run == 1:
+                raise OperationalError('database is locked')
+            return {'sessions': (2, 0.1)}
+
+        with self.assertLogs('accounts.gc') as logs:
+            self.run_scheduler(side_effect, runs=2)
+        self.assertIn('accounts_gc run failed', logs.output[0])
+        self.assertIn('accounts_gc removed 2 sessions', logs.output[1])
+
+    @override_settings(ACCOUNTS_GC={'INTERVAL': 0})
+    def test_start_scheduler_disabled(self):
+        with mock.patch('accounts.gc._scheduler', None):
+            self.assertIsNone(start_scheduler())
+
+    @override_settings(ACCOUNTS_GC={'INTERVAL': 60})
+    def test_start_scheduler_starts_once(self):
+        with mock.patch('accounts.gc._scheduler', None), mock.patch('accounts.gc.Scheduler') as scheduler:
+            self.assertIs(start_scheduler(), start_scheduler())
+        scheduler.assert_called_once_with(60)
+        scheduler.return_value.start.assert_called_once_with()
+
+
+class ImportUsersTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'users.jsonl')
+
+    def import_users(self, *records, **options):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(record if isinstance(record, str) else json.dumps(record))
+                f.write('\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_users', self.path, workers=0, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_and_rejects_records(self):
+        out, err = self.import_users(
+            {'username': 'bob', 'email': 'Bob@Example.com', 'password': 'Sturdy-pass-42', 'bio': ' Hi '},
+            {'username': 'carol'},
+            {'username': 'alice'},
+            {'username': 'dave', 'email': 'bob@example.com'},
+            {'username': 12},
+            {'username': 'erin', 'password': 42},
+            {'username': 'frank', 'first_name': ['F']},
+            'not json',
+            batch_size=2,
+        )
+        self.assertIn('Imported 2 users', out)
+        self.assertIn('6 records rejected', out)
+        self.assertIn('Record 3: Username "alice" already exists.', err)
+        self.assertIn('Record 4: Email "bob@example.com" is already registered.', err)
+        self.assertIn('Record 5: "username" must be a string.', err)
+        self.assertIn('Record 6: "password" must be a string.', err)
+        self.assertIn('Record 7: "first_name" must be a string.', err)
+        self.assertIn('Record 8: Invalid JSON', err)
+
+        bob = User.objects.select_related('profile').get(username='bob')
+        self.assertEqual(bob.email, 'bob@example.com')
+        self.assertTrue(bob.check_password('Sturdy-pass-42'))
+        self.assertEqual(bob.profile.bio, 'Hi')
+        self.assertFalse(User.objects.get(username='carol').has_usable_password())
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_resumes_after_checkpoint(self):
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            json.dump({'path': os.path.abspath(self.path), 'records': 1}, f)
+        out, _ = self.import_users({'username': 'bob'}, {'username': 'carol'})
+        self.assertIn('Resuming after record 1', out)
+        self.assertQuerySetEqual(
+            User.objects.exclude(pk=self.user.pk).values_list('username', flat=True), ['carol'],
+        )
+
+    def test_restart_ignores_checkpoint(self):
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            json.dump({'path': os.path.abspath(self.path), 'records': 1}, f)
+        self.import_users({'username': 'bob'}, restart=True)
+        self.assertTrue(User.objects.filter(username='bob').exists())
+
+    def test_checkpoint_of_another_file(self):
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            json.dump({'path': '/elsewhere.jsonl', 'records': 1}, f)
+        with self.assertRaisesMessage(CommandError, 'belongs to another file'):
+            self.import_users({'username': 'bob'})
+
+
+class CursorTests(SimpleTestCase):
+    def cursor(self, raw):
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def test_round_trip(self):
+        user = User(pk=42, date_joined=timezone.now())
+        self.assertEqual(decode_cursor(encode_cursor(user)), (user.date_joined, 42))
+
+    def test_pk_out_of_range_is_invalid(self):
+        self.assertIsNone(decode_cursor(self.cursor(f'2024-01-01T00:00:00|{10 ** 30}')))
+        self.assertIsNone(decode_cursor(self.cursor('2024-01-01T00:00:00|-1')))
+
+    def test_garbage_is_invalid(self):
+        self.assertIsNone(decode_cursor('not a cursor'))
+
+
+@override_settings(AVATAR=dict(settings.AVATAR, MAX_UPLOAD_SIZE=10))
+class AvatarUploadTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post_avatar(self, client):
+        avatar = SimpleUploadedFile('avatar.png', b'x' * 100, content_type='image/png')
+        return client.post(reverse('accounts:profile'), {'avatar': avatar})
+
+    def test_oversized_upload_is_dropped_by_the_profile_view(self):
+        response = self.post_avatar(self.client)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Files must be at most', str(response.context['form'].errors))
+
+    def test_csrf_still_enforced(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(self.post_avatar(client).status_code, 403)
+
+        client.get(reverse('accounts:profile'))
+        client.defaults['HTTP_X_CSRFTOKEN'] = client.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertEqual(self.post_avatar(client).status_code, 200)
+
+    def test_async_profile_view(self):
+        avatar = SimpleUploadedFile('avatar.png', b'x' * 100, content_type='image/png')
+        request = RequestFactory().post(reverse('accounts:profile'), {'avatar': avatar})
+        request._dont_enforce_csrf_checks = True
+        request.account = SimpleNamespace(is_authenticated=True)
+        with mock.patch.object(async_views, 'arender') as arender, \
+                mock.patch.object(async_views, 'aensure_profile', return_value=self.user.profile):
+            async_to_sync(async_views.profile_view)(request)
+        form = arender.call_args[0][2]['form']
+        self.assertIn('Files must be at most', str(form.errors))
+
+    def test_handler_is_not_installed_globally(self):
+        self.assertNotIn('accounts.avatars.AvatarUploadHandler', settings.FILE_UPLOAD_HANDLERS)
+
+
+class LoginRequiredRedirectTests(AccountsTestCase):
+    """Anonymous requests to protected views go to the namespaced login URL"""
+
+    def test_sync_views(self):
+        for name in ('logout', 'profile', 'dashboard'):
+            with self.subTest(name=name):
+                url = reverse(f'accounts:{name}')
+                response = self.client.get(url)
+                self.assertRedirects(response, f"{reverse('accounts:login')}?next={url}", fetch_redirect_response=False)
+
+    def test_async_profile_view(self):
+        url = reverse('accounts:profile')
+        request = RequestFactory().get(url)
+        request.account = SimpleNamespace(is_authenticated=False)
+        response = async_to_sync(async_views.profile_view)(request)
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={url}", fetch_redirect_response=False)
+
+
+class RoleRegistryTests(AccountsTestCase):
+    def test_clear_between_load_and_lookup(self):
+        # Another thread clearing the registry right after this one loaded it
+        load = registry._ensure_loaded
+
+        def load_then_clear():
+            snapshot = load()
+            registry.clear()
+            return snapshot
+
+        with mock.patch.object(registry, '_ensure_loaded', load_then_clear):
+            self.assertEqual(registry.get_by_name('user').role_name, 'user')
+
+    def test_clear_reloads_on_next_lookup(self):
+        role = registry.get_by_name('user')
+        UserRole.objects.filter(pk=role.pk).update(can_view_reports=True)
+        self.assertFalse(registry.get(role.pk).has_permission('view_reports'))
+        registry.clear()
+        self.assertTrue(registry.get(role.pk).has_permission('view_reports'))
+
+
+class OutboxTests(TestCase):
+    def test_connection_failure_backs_off_every_claimed_entry(self):
+        outbox.enqueue_many([('Hi', 'Body', ['a@example.com']), ('Hi', 'Body', ['b@example.com'])])
+        connection = mail.get_connection('django.core.mail.backends.locmem.EmailBackend')
+        with mock.patch.object(connection, 'open', side_effect=OSError('connection refused')):
+            self.assertEqual(outbox.deliver_batch(connection=connection), (0, 2))
+
+        for entry in EmailOutbox.objects.all():
+            self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+            self.assertEqual(entry.attempts, 1)
+            self.assertIn('connection refused', entry.last_error)
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+
+
+class StaticAssetTests(SimpleTestCase):
+    css = b'.card { box-shadow: 0 0 1px rgba(0, 0, 0, .1); }\n' * 40
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_compress_file(self):
+        path = self.write('app.css', self.css)
+        expected = [path + '.gz', path + '.br'] if assets.brotli else [path + '.gz']
+        self.assertEqual(assets.compress_file(path), expected)
+        with open(path + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), self.css)
+        self.assertEqual(assets.compress_file(self.write('small.css', b'a{}')), [])
+
+    @skipUnless(assets.brotli, 'brotli is not installed')
+    def test_brotli_output(self):
+        path = self.write('app.css', self.css)
+        assets.compress_file(path)
+        with open(path + '.br', 'rb') as f:
+            self.assertEqual(assets.brotli.decompress(f.read()), self.css)
+
+    def test_storage_compresses_fingerprinted_copies(self):
+        source = self.write('src/css/app.css', self.css)
+        storage = assets.CompressedManifestStaticFilesStorage(location=os.path.join(self.root, 'out'))
+        with open(source, 'rb') as f:
+            storage.save('css/app.css', f)
+        list(storage.post_process({'css/app.css': (storage, 'css/app.css')}))
+
+        hashed = storage.stored_name('css/app.css')
+        self.assertTrue(assets.is_fingerprinted(hashed))
+        self.assertTrue(os.path.exists(storage.path(hashed) + '.gz'))
+        self.assertFalse(os.path.exists(storage.path('css/app.css') + '.gz'))
+
+    def test_serve_static_picks_compressed_copy(self):
+        self.write('css/app.0123456789ab.css', self.css)
+        self.write('css/app.0123456789ab.css.gz', gzip.compress(self.css))
+        with self.settings(STATIC_ROOT=self.root):
+            request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            response = assets.serve_static(request, 'css/app.0123456789ab.css')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+            response = assets.serve_static(RequestFactory().get('/'), 'css/app.0123456789ab.css')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(b''.join(response.streaming_content), self.css)
+
+    @override_settings(STORAGES=dict(settings.STORAGES, staticfiles={
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    }))
+    def test_vendor_url(self):
+        self.addCleanup(assets.vendor_url.cache_clear)
+        path, upstream, _ = assets.VENDOR_ASSETS['bootstrap.css']
+        missing = mock.patch('accounts.assets.finders.find', return_value=None)
+        for cdn, url in ((False, f'/static/{path}'), (True, upstream)):
+            assets.vendor_url.cache_clear()
+            with self.subTest(cdn=cdn), self.settings(VENDOR_ASSETS_CDN=cdn), missing:
+                self.assertEqual(assets.vendor_url('bootstrap.css'), url)
+                self.assertEqual(bool(assets.check_vendor_assets(None)), not cdn)
+
+
+@override_settings(REQUEST_METRICS={'ENABLED': True, 'ALLOWED_IPS': ('127.0.0.1',), 'TOKEN': 's3cret'})
+class MetricsViewTests(SimpleTestCase):
+    def get(self, ip, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return instrumentation.metrics_view(RequestFactory().get('/metrics', REMOTE_ADDR=ip, **headers))
+
+    def test_allowed_ip_needs_no_token(self):
+        self.assertEqual(self.get('127.0.0.1').status_code, 200)
+
+    def test_token_opens_other_ips(self):
+        self.assertEqual(self.get('203.0.113.7', 'Bearer s3cret').status_code, 200)
+        self.assertEqual(self.get('203.0.113.7', 'Bearer wrong').status_code, 403)
+        self.assertEqual(self.get('203.0.113.7').status_code, 403)
+
+    @override_settings(REQUEST_METRICS={'ENABLED': True, 'ALLOWED_IPS': ('127.0.0.1',), 'TOKEN': None})
+    def test_without_token_only_allowed_ips(self):
+        self.assertEqual(self.get('203.0.113.7', 'Bearer None').status_code, 403)
+        self.assertEqual(self.get('127.0.0.1').status_code, 200)
+
+    @override_settings(REQUEST_METRICS={'ENABLED': False})
+    def test_disabled(self):
+        with self.assertRaises(Http404):
+            self.get('127.0.0.1')
+
+
+@override_settings(QUERY_AUDIT={'THRESHOLD': 2, 'RAISE': False, 'REPORT_PATH': None})
+class QueryAuditTests(AccountsTestCase):
+    def lookups(self, count):
+        for pk in range(count):
+            User.objects.filter(pk=pk).exists()
+
+    def test_normalize_groups_parameters(self):
+        self.assertEqual(
+            query_audit.normalize("SELECT * FROM t WHERE a = 5 AND b = 'x''y' AND c IN (?, ?, ?)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)',
+        )
+
+    def test_reports_repeated_shape_with_origin(self):
+        with self.assertLogs('accounts.query_audit', 'WARNING'):
+            with query_audit.audit('loop') as log:
+                self.lookups(3)
+                User.objects.count()
+        [offender] = log.offenders()
+        self.assertEqual(offender['count'], 3)
+        self.assertIn('accounts/tests.py', offender['stack'][0])
+        self.assertIn('in lookups', offender['stack'][0])
+
+    @override_settings(QUERY_AUDIT={'THRESHOLD': 2, 'RAISE': True, 'REPORT_PATH': None})
+    def test_raise(self):
+        with self.assertLogs('accounts.query_audit', 'WARNING'):
+            with self.assertRaisesMessage(query_audit.RepeatedQueries, 'loop ran the same query 3 times'):
+                with query_audit.audit('loop'):
+                    self.lookups(3)
+        with query_audit.audit('fine'):
+            self.lookups(2)
+
+    @override_settings(QUERY_AUDIT={'THRESHOLD': 2, 'RAISE': True, 'REPORT_PATH': None})
+    def test_error_in_block_is_not_replaced(self):
+        with self.assertLogs('accounts.query_audit', 'WARNING'):
+            with self.assertRaises(ZeroDivisionError):
+                with query_audit.audit('loop'):
+                    self.lookups(3)
+                    1 / 0
+        self.assertIsNone(query_audit._current.get())
+
+    def test_nested_audit_keeps_outer_log(self):
+        with self.assertLogs('accounts.query_audit', 'WARNING') as logs:
+            with query_audit.audit('outer') as outer:
+                User.objects.count()
+                with query_audit.audit('inner') as inner:
+                    self.lookups(2)
+                self.lookups(1)
+                self.assertIs(query_audit._current.get(), outer)
+        self.assertIsNone(query_audit._current.get())
+        # Only the outer log saw the shape three times
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('outer ran the same query 3 times', logs.output[0])
+        self.assertEqual(sum(inner.counts.values()), 2)
+        self.assertEqual(sum(outer.counts.values()), 4)
+
+
+class DeployVersionTests(SimpleTestCase):
+    def test_app_template_dirs_are_hashed(self):
+        # accounts' own templates are found by the app_directories loader
+        app_templates = os.path.join(os.path.dirname(__file__), 'templates')
+        self.assertIn(app_templates, page_cache._template_dirs())
+
+
+@override_settings(SESSION_REFRESH_INTERVAL=300)
+class SessionRefreshTests(SimpleTestCase):
+    def process(self, data, touch=True, change=None):
+        """
+        Run the middleware over a saved session holding data, or over a new
+        session without a cookie when data is empty; returns the session.
+        """
+        session_key = None
+        if data:
+            stored = SessionStore()
+            stored.update(data)
+            stored.save()
+            session_key = stored.session_key
+        session = SessionStore(session_key)
+        if touch:
+            session.get('anything')
+        if change:
+            session.update(change)
+        request = RequestFactory().get('/')
+        request.session = session
+        SessionRefreshMiddleware(lambda request: HttpResponse()).process_response(request, HttpResponse())
+        return session
+
+    def test_stale_session_is_refreshed(self):
+        stamp = int(time.time()) - 301
+        session = self.process({'user': 1, SessionRefreshMiddleware.REFRESHED_KEY: stamp})
+        self.assertTrue(session.modified)
+        self.assertGreater(session[SessionRefreshMiddleware.REFRESHED_KEY], stamp)
+
+    def test_recently_refreshed_session_is_not_saved(self):
+        session = self.process({'user': 1, SessionRefreshMiddleware.REFRESHED_KEY: int(time.time())})
+        self.assertFalse(session.modified)
+
+    def test_untouched_and_empty_sessions_are_left_alone(self):
+        self.assertFalse(self.process({'user': 1}, touch=False).modified)
+        self.assertFalse(self.process({}).modified)
+
+    @override_settings(SESSION_REFRESH_INTERVAL=0)
+    def test_disabled(self):
+        self.assertFalse(self.process({'user': 1}).modified)
+
+    def test_modified_session_is_stamped(self):
+        session = self.process({'user': 1, SessionRefreshMiddleware.REFRESHED_KEY: 0}, change={'user': 2})
+        self.assertGreater(session[SessionRefreshMiddleware.REFRESHED_KEY], 0)
+
+
+@override_settings(LOGIN_THROTTLE_WINDOW=100, LOGIN_THROTTLE_USERNAME_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=5)
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        clock = mock.patch.object(throttle.time, 'time', return_value=1000.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+
+    def record(self, ip, username, times=1):
+        for _ in range(times):
+            throttle.record_failure(ip, username)
+
+    def test_username_limit_applies_across_addresses(self):
+        self.record('10.0.0.1', 'Alice', 2)
+        self.record('10.0.0.2', ' alice ')
+        self.assertTrue(throttle.is_throttled('10.0.0.3', 'ALICE'))
+        self.assertFalse(throttle.is_throttled('10.0.0.3', 'bob'))
+
+    def test_ip_limit_applies_across_usernames(self):
+        for n in range(5):
+            self.record('10.0.0.1', f'user{n}')
+        self.assertTrue(throttle.is_throttled('10.0.0.1', 'someone-else'))
+        self.assertFalse(throttle.is_throttled('10.0.0.2', 'someone-else'))
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        self.record('10.0.0.1', 'alice', 3)
+        self.clock.return_value = 1150.0
+        self.assertEqual(throttle.get_counts('10.0.0.1', 'alice')['username'], 1.5)
+        self.assertFalse(throttle.is_throttled('10.0.0.1', 'alice'))
+        self.clock.return_value = 1200.0
+        self.assertEqual(throttle.get_counts('10.0.0.1', 'alice'), {'ip': 0, 'username': 0})
+
+    def test_reset_username_keeps_the_ip_count(self):
+        self.record('10.0.0.1', 'alice', 3)
+        throttle.reset_username('Alice')
+        self.assertEqual(throttle.get_counts('10.0.0.1', 'alice'), {'ip': 3, 'username': 0})
+
+    @override_settings(LOGIN_THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        self.record('10.0.0.1', 'alice', 3)
+        self.assertFalse(throttle.is_throttled('10.0.0.1', 'alice'))
+
+
+@override_settings(LOGIN_THROTTLE_USERNAME_LIMIT=2)
+class ThrottledLoginTests(AccountsTestCase):
+    def test_over_limit_is_rejected_before_any_query(self):
+        url = reverse('accounts:login')
+        for _ in range(2):
+            self.client.post(url, {'username': 'alice', 'password': 'wrong-password'})
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'username': 'alice', 'password': self.password})
+        self.assertEqual(response.status_code, 429)
+
+
+class ClientIpTests(SimpleTestCase):
+    """The throttle key must not come from hops the client can write"""
+
+    def ip(self, forwarded_for):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR=forwarded_for, REMOTE_ADDR='10.0.0.1')
+        return get_client_ip(request)
+
+    @override_settings(TRUSTED_PROXY_COUNT=0)
+    def test_no_proxy_ignores_forwarded_for(self):
+        self.assertEqual(self.ip('203.0.113.9'), '10.0.0.1')
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_one_proxy_uses_the_hop_it_appended(self):
+        self.assertEqual(self.ip('1.2.3.4, 203.0.113.9'), '203.0.113.9')
+
+    @override_settings(TRUSTED_PROXY_COUNT=2)
+    def test_two_proxies_skip_the_inner_hop(self):
+        self.assertEqual(self.ip('1.2.3.4, 203.0.113.9, 10.0.0.2'), '203.0.113.9')
+
+    @override_settings(TRUSTED_PROXY_COUNT=2)
+    def test_short_chain_falls_back_to_remote_addr(self):
+        self.assertEqual(self.ip('203.0.113.9'), '10.0.0.1')
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    PASSWORD_HASH_POOL={'ENABLED': True, 'WORKERS': 1, 'MAX_PENDING': 1, 'TIMEOUT': 0.2},
+)
+class HashPoolTests(SimpleTestCase):
+    def tearDown(self):
+        hash_pool.shutdown()
+
+    def test_crashed_worker_is_replaced(self):
+        with self.assertRaises(hash_pool.HashPoolBusy):
+            hash_pool._run(os._exit, 1)
+        self.assertTrue(hashers.is_password_usable(hash_pool._run(hash_pool._make, 'secret')))
+
+    def test_timed_out_job_keeps_its_slot(self):
+        with self.assertRaises(hash_pool.HashPoolBusy):
+            hash_pool._run(time.sleep, 1)
+        # The sleep is still running, so the only slot is taken
+        with self.assertRaisesMessage(hash_pool.HashPoolBusy, 'queue is full'):
+            hash_pool._run(hash_pool._make, 'secret')
+        time.sleep(1)
+        hash_pool._run(hash_pool._make, 'secret')
+
+
+@override_settings(DATABASE_LOCK_RETRY_DELAY=0)
+class LockRetryTests(TransactionTestCase):
+    """retry_on_lock only retries outside a transaction, hence TransactionTestCase"""
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_retried_successful_login_still_resets_counter(self):
+        user = User.objects.create_user('bob', 'bob@example.com', 'x')
+        UserProfile.objects.filter(user=user).update(login_attempts=3, is_locked=True)
+        profile = UserProfile.objects.get(user=user)
+
+        save = UserProfile.save
+        calls = []
+
+        def locked_once(instance, *args, **kwargs):
+            calls.append(kwargs.get('update_fields'))
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return save(instance, *args, **kwargs)
+
+        with mock.patch.object(UserProfile, 'save', locked_once):
+            record_successful_login(profile, '127.0.0.1')
+
+        self.assertEqual(len(calls), 2)
+        profile.refresh_from_db()
+        self.assertEqual(profile.login_attempts, 0)
+        self.assertFalse(profile.is_locked)
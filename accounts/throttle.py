@@ -0,0 +1,122 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+KEY_PREFIX = 'login-throttle'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_cache():
+    """Cache used for the login throttle counters"""
+    return caches[_setting('LOGIN_THROTTLE_CACHE', 'default')]
+
+
+def get_window():
+    """Length of the sliding window in seconds"""
+    return _setting('LOGIN_THROTTLE_WINDOW', 15 * 60)
+
+
+def get_limits():
+    """Maximum failed attempts per window, keyed by scope"""
+    return {
+        'ip': _setting('LOGIN_THROTTLE_IP_LIMIT', 20),
+        'username': _setting('LOGIN_THROTTLE_USERNAME_LIMIT', 5),
+    }
+
+
+def is_enabled():
+    return _setting('LOGIN_THROTTLE_ENABLED', True)
+
+
+def normalize_username(username):
+    """Fold the submitted username or email so variants share one counter"""
+    return (username or '').strip().lower()
+
+
+def _scope_key(scope, value):
+    # Hash values so arbitrary user input always forms a valid cache key
+    digest = hashlib.sha1(value.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:{scope}:{digest}'
+
+
+def _scopes(ip_address, username):
+    scopes = []
+    if ip_address:
+        scopes.append(('ip', ip_address))
+    username = normalize_username(username)
+    if username:
+        scopes.append(('username', username))
+    return scopes
+
+
+def _bucket_keys(scope, value, now, window):
+    bucket = int(now // window)
+    base = _scope_key(scope, value)
+    return f'{base}:{bucket}', f'{base}:{bucket - 1}'
+
+
+def get_counts(ip_address, username):
+    """
+    Return the sliding-window failure count for the client IP and username.
+
+    The window is approximated from the current and previous fixed buckets,
+    weighting the previous bucket by how much of it still overlaps the
+    window. Both scopes are read with a single cache round-trip.
+    """
+    cache = get_cache()
+    window = get_window()
+    now = time.time()
+    overlap = 1 - (now % window) / window
+
+    keys = {}
+    for scope, value in _scopes(ip_address, username):
+        keys[scope] = _bucket_keys(scope, value, now, window)
+
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    counts = {}
+    for scope, (current, previous) in keys.items():
+        counts[scope] = values.get(current, 0) + values.get(previous, 0) * overlap
+    return counts
+
+
+def is_throttled(ip_address, username):
+    """Return True when the client IP or the username is over its limit"""
+    if not is_enabled():
+        return False
+    limits = get_limits()
+    counts = get_counts(ip_address, username)
+    return any(count >= limits[scope] for scope, count in counts.items())
+
+
+def record_failure(ip_address, username):
+    """Count a failed login attempt against the client IP and the username"""
+    if not is_enabled():
+        return
+    cache = get_cache()
+    window = get_window()
+    now = time.time()
+
+    for scope, value in _scopes(ip_address, username):
+        current, _ = _bucket_keys(scope, value, now, window)
+        # Buckets live for two windows so the previous one can still be weighted
+        cache.add(current, 0, timeout=2 * window)
+        try:
+            cache.incr(current)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(current, 1, timeout=2 * window)
+
+
+def reset_username(username):
+    """Clear the username counters after a successful login"""
+    username = normalize_username(username)
+    if not username:
+        return
+    window = get_window()
+    get_cache().delete_many(_bucket_keys('username', username, time.time(), window))
@@ -1,22 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'accounts'
 
+# Under ASGI the I/O-bound views are served by their async implementations
+io_views = async_views if settings.ACCOUNTS_ASYNC_VIEWS else views
+
 urlpatterns = [
     # Authentication URLs
     path('register/', views.register_view, name='register'),
-    path('login/', views.login_view, name='login'),
+    path('login/', io_views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
-    path('dashboard/', views.dashboard_view, name='dashboard'),
-    path('profile/', views.profile_view, name='profile'),
+    path('dashboard/', io_views.dashboard_view, name='dashboard'),
+    path('profile/', io_views.profile_view, name='profile'),
     
     # Password reset URLs
-    path('password_reset/', views.password_reset_request_view, name='password_reset'),
+    path('password_reset/', io_views.password_reset_request_view, name='password_reset'),
     path('password_reset/<str:token>/', views.password_reset_confirm_view, name='password_reset_confirm'),
     path('change-password/', views.change_password_view, name='change_password'),
     
     # Admin URLs
     path('admin-dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
     path('users-list/', views.users_list_view, name='users_list'),
+    path('users-export/', views.export_users_view, name='export_users'),
 ]
@@ -1,21 +1,27 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils.crypto import get_random_string
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.urls import reverse
-from django.http import HttpResponseRedirect
-from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 import os
 
+from . import avatars, exports, hash_pool, outbox, page_cache, reset_tokens, throttle
+from .account import ensure_profile
 from .forms import (
     UserRegistrationForm, UserLoginForm, UserProfileForm,
     PasswordResetRequestForm, PasswordResetForm, PasswordChangeForm
 )
-from .models import UserProfile, PasswordResetToken, UserRole
+from .credentials import filter_by_email, get_profile
+from .decorators import require_permission
+from .lockout import get_lockout_threshold, record_successful_login, register_failed_attempt
+from .models import UserProfile, UserRole
+from .pagination import filter_users, get_user_counts, paginate_users
 
 
 def register_view(request):
@@ -26,15 +32,22 @@ def register_view(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=True)
-            messages.success(request, 'Registration successful! You can now log in.')
-            return redirect('accounts:login')
-        else:
-            for field, errors in form.errors.items():
-                for error in errors:
-                    messages.error(request, f'{field}: {error}')
+            try:
+                form.save(commit=True)
+            except ValidationError as exc:
+                # Lost a race with a concurrent sign-up for the same name or email
+                form.add_error(None, exc)
+            else:
+                messages.success(request, 'Registration successful! You can now log in.')
+                return redirect('accounts:login')
+        for field, errors in form.errors.items():
+            for error in errors:
+                messages.error(request, f'{field}: {error}')
     else:
-        form = UserRegistrationForm()
+        return page_cache.render_shell(
+            request, 'accounts/register.html',
+            lambda: {'form': UserRegistrationForm(), 'page_title': 'Register'},
+        )
 
     context = {'form': form, 'page_title': 'Register'}
     return render(request, 'accounts/register.html', context)
@@ -46,69 +59,52 @@ def login_view(request):
         return redirect('accounts:dashboard')
 
     if request.method == 'POST':
+        client_ip = get_client_ip(request)
+        submitted_username = request.POST.get('username', '')
+
+        # Reject abusive clients from the cache before any query or hashing
+        if throttle.is_throttled(client_ip, submitted_username):
+            messages.error(request, 'Too many login attempts. Please try again later.')
+            form = UserLoginForm(initial={'username': submitted_username})
+            return render(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'}, status=429)
+
         form = UserLoginForm(request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
             password = form.cleaned_data.get('password')
             remember_me = form.cleaned_data.get('remember_me')
 
-            # Try to authenticate with username or email
-            user = None
-            if '@' in username:
-                try:
-                    user_obj = User.objects.get(email=username)
-                    
-                    # Check if account is locked
-                    try:
-                        if user_obj.profile.is_locked:
-                            messages.error(request, 'Your account is locked due to too many failed login attempts. Please contact support.')
-                            return render(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'})
-                    except UserProfile.DoesNotExist:
-                        pass
-                    
-                    user = authenticate(username=user_obj.username, password=password)
-                except User.DoesNotExist:
-                    user = None
-            else:
-                try:
-                    user_obj = User.objects.get(username=username)
-                    
-                    # Check if account is locked
-                    try:
-                        if user_obj.profile.is_locked:
-                            messages.error(request, 'Your account is locked due to too many failed login attempts. Please contact support.')
-                            return render(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'})
-                    except UserProfile.DoesNotExist:
-                        pass
-                    
-                    user = authenticate(username=username, password=password)
-                except User.DoesNotExist:
-                    user = None
+            # The form already resolved the user, profile and role in one query
+            user_obj = form.get_user()
+            profile = get_profile(user_obj)
+
+            # Check if account is locked
+            if profile is not None and profile.is_locked:
+                throttle.record_failure(client_ip, submitted_username)
+                messages.error(request, 'Your account is locked due to too many failed login attempts. Please contact support.')
+                return render(request, 'accounts/login.html', {'form': form, 'page_title': 'Login'})
+
+            user = authenticate(request, user=user_obj, password=password)
 
             if user is not None:
                 # Successful login
                 login(request, user)
+                throttle.reset_username(submitted_username)
                 
                 # Set session expiry based on remember_me
                 if remember_me:
-                    request.session.set_expiry(timedelta(days=30))
+                    request.session.set_expiry(settings.SESSION_REMEMBER_ME_AGE)
                 else:
                     request.session.set_expiry(0)
                 
                 messages.success(request, f'Welcome back, {user.first_name or user.username}!')
                 
                 # Update user profile with login info
-                try:
-                    profile = user.profile
-                    profile.last_login_ip = get_client_ip(request)
-                    profile.login_attempts = 0
-                    profile.is_locked = False
-                    profile.last_login = timezone.now()
-                    profile.save()
-                except UserProfile.DoesNotExist:
+                if profile is not None:
+                    record_successful_login(profile, client_ip)
+                else:
                     UserProfile.objects.create(
                         user=user,
-                        last_login_ip=get_client_ip(request),
+                        last_login_ip=client_ip,
                         last_login=timezone.now()
                     )
 
@@ -119,46 +115,39 @@ def login_view(request):
                 return redirect('accounts:dashboard')
             else:
                 # Failed login attempt
-                try:
-                    if '@' in username:
-                        user_obj = User.objects.get(email=username)
-                    else:
-                        user_obj = User.objects.get(username=username)
+                throttle.record_failure(client_ip, submitted_username)
+                if profile is not None:
+                    # Count the failure and lock the account in one UPDATE
+                    attempts = register_failed_attempt(profile)
                     
-                    # Update failed login attempts
-                    try:
-                        profile = user_obj.profile
-                        profile.login_attempts = (profile.login_attempts or 0) + 1
-                        
-                        # Lock account after 5 failed attempts
-                        if profile.login_attempts >= 5:
-                            profile.is_locked = True
-                            messages.warning(
-                                request,
-                                f'Too many failed login attempts ({profile.login_attempts}). '
-                                'Your account has been locked. Please contact support.'
-                            )
-                        else:
-                            remaining_attempts = 5 - profile.login_attempts
-                            messages.error(
-                                request,
-                                f'Invalid credentials. {remaining_attempts} attempts remaining.'
-                            )
-                        
-                        profile.last_login_attempt = timezone.now()
-                        profile.save()
-                    except UserProfile.DoesNotExist:
-                        messages.error(request, 'Invalid username or password.')
-                except User.DoesNotExist:
+                    if profile.is_locked:
+                        messages.warning(
+                            request,
+                            f'Too many failed login attempts ({attempts}). '
+                            'Your account has been locked. Please contact support.'
+                        )
+                    else:
+                        remaining_attempts = get_lockout_threshold() - attempts
+                        messages.error(
+                            request,
+                            f'Invalid credentials. {remaining_attempts} attempts remaining.'
+                        )
+                else:
                     messages.error(request, 'Invalid username or password.')
+        elif 'username' in form.errors:
+            # Unknown usernames count towards the throttle as well
+            throttle.record_failure(client_ip, submitted_username)
     else:
-        form = UserLoginForm()
+        return page_cache.render_shell(
+            request, 'accounts/login.html',
+            lambda: {'form': UserLoginForm(), 'page_title': 'Login'},
+        )
 
     context = {'form': form, 'page_title': 'Login'}
     return render(request, 'accounts/login.html', context)
 
 
-@login_required(login_url='login')
+@login_required(login_url='accounts:login')
 def logout_view(request):
     """User logout view"""
     logout(request)
@@ -169,29 +158,24 @@ def logout_view(request):
 @login_required(login_url='accounts:login')
 def dashboard_view(request):
     """User dashboard view"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        profile = UserProfile.objects.create(user=request.user)
+    profile = ensure_profile(request.account)
 
     context = {
         'profile': profile,
         'page_title': 'Dashboard',
-        'user_role': profile.role.role_name if profile.role else 'user'
     }
     return render(request, 'accounts/dashboard.html', context)
 
 
-@login_required(login_url='login')
+@login_required(login_url='accounts:login')
+@avatars.avatar_uploads
 def profile_view(request):
     """User profile view and edit"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        profile = UserProfile.objects.create(user=request.user)
+    profile = ensure_profile(request.account)
 
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
+        avatars.report_rejected_uploads(request, form)
         if form.is_valid():
             form.save()
             messages.success(request, 'Profile updated successfully!')
@@ -216,18 +200,9 @@ def password_reset_request_view(request):
         form = PasswordResetRequestForm(request.POST)
         if form.is_valid():
             email = form.cleaned_data.get('email')
-            user = User.objects.get(email=email)
+            user = filter_by_email(User.objects.all(), email).get()
 
-            # Generate reset token
-            token = get_random_string(50)
-            expires_at = timezone.now() + timedelta(hours=24)
-
-            PasswordResetToken.objects.filter(user=user, is_used=False).delete()
-            PasswordResetToken.objects.create(
-                user=user,
-                token=token,
-                expires_at=expires_at
-            )
+            token = reset_tokens.make_token(user)
 
             # Send email
             reset_url = request.build_absolute_uri(
@@ -241,7 +216,7 @@ def password_reset_request_view(request):
         form = PasswordResetRequestForm()
 
     context = {'form': form, 'page_title': 'Reset Password'}
-    return render(request, 'accounts/password_reset_request.html', context)
+    return render(request, 'accounts/password_reset.html', context)
 
 
 def password_reset_confirm_view(request, token):
@@ -249,26 +224,20 @@ def password_reset_confirm_view(request, token):
     if request.user.is_authenticated:
         return redirect('accounts:dashboard')
 
-    try:
-        reset_token = PasswordResetToken.objects.get(
-            token=token,
-            is_used=False,
-            expires_at__gt=timezone.now()
-        )
-    except PasswordResetToken.DoesNotExist:
+    user = reset_tokens.get_user(token)
+    if user is None:
         messages.error(request, 'Invalid or expired password reset link.')
         return redirect('accounts:password_reset')
 
     if request.method == 'POST':
-        form = PasswordResetForm(reset_token.user, request.POST)
+        form = PasswordResetForm(user, request.POST)
         if form.is_valid():
             form.save()
-            reset_token.is_used = True
-            reset_token.save()
+            reset_tokens.consume(token, user)
             messages.success(request, 'Password has been reset successfully. Please log in.')
             return redirect('accounts:login')
     else:
-        form = PasswordResetForm(reset_token.user)
+        form = PasswordResetForm(user)
 
     context = {'form': form, 'token': token, 'page_title': 'Reset Password'}
     return render(request, 'accounts/password_reset_confirm.html', context)
@@ -283,9 +252,9 @@ def change_password_view(request):
             old_password = form.cleaned_data.get('old_password')
             new_password1 = form.cleaned_data.get('new_password1')
 
-            user = authenticate(username=request.user.username, password=old_password)
+            user = authenticate(request, user=request.user, password=old_password)
             if user is not None:
-                user.set_password(new_password1)
+                hash_pool.set_password(user, new_password1)
                 user.save()
                 messages.success(request, 'Password changed successfully!')
                 return redirect('accounts:dashboard')
@@ -299,17 +268,19 @@ def change_password_view(request):
 
 
 def get_client_ip(request):
-    """Get client IP address"""
+    """Get client IP address, trusting only the hops added by TRUSTED_PROXY_COUNT proxies"""
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    if proxies and x_forwarded_for:
+        hops = [hop.strip() for hop in x_forwarded_for.split(',')]
+        # Each proxy appends the address it saw, so count from the right
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
 
 
 def send_password_reset_email(email, reset_url, user_name):
-    """Send password reset email"""
+    """Queue the password reset email for the send_outbox worker"""
     subject = 'Password Reset Request'
     message = f"""
     Hello {user_name},
@@ -326,49 +297,64 @@ def send_password_reset_email(email, reset_url, user_name):
     Authentication System
     """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            os.environ.get('EMAIL_FROM', 'noreply@authsystem.com'),
-            [email],
-            fail_silently=False,
-        )
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
+    outbox.enqueue(
+        subject,
+        message,
+        [email],
+        from_email=os.environ.get('EMAIL_FROM', 'noreply@authsystem.com'),
+    )
 
 
 # Permission-based views
 @login_required(login_url='accounts:login')
 def admin_dashboard_view(request):
     """Admin dashboard view"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    account = request.account
     
-    if profile.role and profile.role.role_name != 'admin':
+    if account.profile is None:
+        raise Http404('User profile not found.')
+    if account.profile.role_id and not account.is_admin:
         messages.error(request, 'Access denied. Admin access required.')
         return redirect('accounts:dashboard')
 
-    all_users = User.objects.all()
+    users = paginate_users(filter_users(request.GET), request.GET)
     context = {
-        'all_users': all_users,
-        'total_users': all_users.count(),
-        'page_title': 'Admin Dashboard'
+        'users': users,
+        'page_title': 'Admin Dashboard',
+        **get_user_counts(),
     }
-    return render(request, 'accounts/admin_dashboard.html', context)
+    return render(request, 'accounts/admin_panel.html', context)
 
 
 @login_required(login_url='accounts:login')
 def users_list_view(request):
     """View list of all users (admin only)"""
-    profile = get_object_or_404(UserProfile, user=request.user)
-    
-    if not profile.has_permission('view_reports'):
+    if request.account.profile is None:
+        raise Http404('User profile not found.')
+    if not request.account.has_permission('view_reports'):
         messages.error(request, 'Access denied.')
         return redirect('accounts:dashboard')
 
-    users = User.objects.all()
+    users = paginate_users(filter_users(request.GET), request.GET)
     context = {
         'users': users,
         'page_title': 'Users List'
     }
     return render(request, 'accounts/users_list.html', context)
+
+
+@login_required(login_url='accounts:login')
+@require_permission('view_reports')
+def export_users_view(request):
+    """Stream every user matching the listing filters as CSV or JSONL"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        raise Http404('Unknown export format.')
+
+    users = filter_users(request.GET, User.objects.all())
+    # ASGI needs an async iterator to stream instead of buffering the export
+    iter_export = exports.aiter_export if isinstance(request, ASGIRequest) else exports.iter_export
+    response = StreamingHttpResponse(iter_export(fmt, users), content_type=exports.FORMATS[fmt])
+    filename = f'users-{timezone.now():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,13 @@
+"""
+ASGI config for the project.
+
+Serves the async implementations of the I/O-bound accounts views.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ACCOUNTS_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
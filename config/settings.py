@@ -23,42 +23,114 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.RequestMetricsMiddleware',
+    'accounts.middleware.QueryAuditMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.middleware.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.middleware.HashPoolBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
+_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for REQUEST_METRICS
+        'BACKEND': 'accounts.instrumentation.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory outside of development
+            'loaders': _TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.account',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Route login, dashboard, profile and password reset requests to their async
+# implementations. config/asgi.py turns this on; WSGI keeps the sync views.
+ACCOUNTS_ASYNC_VIEWS = os.environ.get('ACCOUNTS_ASYNC_VIEWS', '') == '1'
+
+# Database
+# SQLite by default. Set DATABASE_ENGINE=postgresql (plus the POSTGRES_*
+# variables) to run against PostgreSQL once write concurrency outgrows a
+# single file. Connections are kept open for CONN_MAX_AGE seconds and
+# health-checked before reuse instead of being reopened on every request.
+# Behind a transaction-pooling PgBouncer set PGBOUNCER=1, which disables
+# server-side cursors that do not survive a pooled connection.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 600))
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'accounts'),
+            'USER': os.environ.get('POSTGRES_USER', 'accounts'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('PGBOUNCER', '') == '1',
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Pragmas applied to every new SQLite connection (see accounts.db).
+# cache_size is negative, so it is in KiB (64 MiB); mmap_size is in bytes.
+SQLITE_PRAGMAS = {
+    # Milliseconds a connection waits on a locked database before failing
+    'busy_timeout': 5000,
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
 }
 
+# WAL lets readers run alongside the single writer, and synchronous=NORMAL
+# is durable in WAL mode apart from the last commits on power loss. WAL is
+# persistent and rewrites the database header, so it is opt-in with
+# SQLITE_WAL=1 for deployments; the checked-in dev database stays in
+# rollback-journal mode.
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '') == '1'
+if SQLITE_WAL:
+    SQLITE_PRAGMAS.update({'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+
+# Writes that hit a transient "database is locked" or serialization error
+# are retried this many times, backing off from the delay (seconds).
+DATABASE_LOCK_RETRIES = 3
+DATABASE_LOCK_RETRY_DELAY = 0.05
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -77,6 +149,68 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PASSWORD_HASH_ALGORITHM selects the hasher used for new hashes (pbkdf2,
+# argon2 or scrypt; argon2 needs the argon2-cffi package). The remaining
+# hashers stay enabled so existing hashes still verify, and they are
+# upgraded to the preferred algorithm and cost on the next successful login.
+# Size the cost per environment with `python manage.py benchmark_hashers`.
+PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'pbkdf2')
+
+PASSWORD_HASH_COST = {
+    'pbkdf2': {
+        'iterations': int(os.environ.get('PBKDF2_ITERATIONS', 600000)),
+    },
+    'argon2': {
+        'time_cost': int(os.environ.get('ARGON2_TIME_COST', 2)),
+        'memory_cost': int(os.environ.get('ARGON2_MEMORY_COST', 102400)),
+        'parallelism': int(os.environ.get('ARGON2_PARALLELISM', 8)),
+    },
+    'scrypt': {
+        'work_factor': int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14)),
+    },
+}
+
+_PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+}
+
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASH_ALGORITHM]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASH_ALGORITHM
+]
+
+# Optional process pool for hashing and verifying passwords off the request
+# thread. Requests that would exceed MAX_PENDING queued jobs get a 503.
+PASSWORD_HASH_POOL = {
+    'ENABLED': os.environ.get('PASSWORD_HASH_POOL', '') == '1',
+    'WORKERS': int(os.environ.get('PASSWORD_HASH_POOL_WORKERS', os.cpu_count() or 1)),
+    'MAX_PENDING': int(os.environ.get('PASSWORD_HASH_POOL_MAX_PENDING', 64)),
+    'TIMEOUT': 10,
+}
+
+# Password reset tokens
+# SignedTokenBackend issues stateless HMAC tokens bound to the password hash
+# and last login, checked with one user fetch and no writes. Switch to
+# DatabaseTokenBackend to keep an audit trail in PasswordResetToken; clear
+# its old rows with `python manage.py purge_reset_tokens`.
+PASSWORD_RESET_TOKEN_BACKEND = os.environ.get(
+    'PASSWORD_RESET_TOKEN_BACKEND', 'accounts.reset_tokens.SignedTokenBackend'
+)
+PASSWORD_RESET_TIMEOUT = 60 * 60 * 24
+
+# Garbage collection of used/expired reset tokens and expired sessions.
+# Rows are deleted CHUNK_SIZE at a time, sleeping PAUSE seconds between
+# chunks. Run `python manage.py accounts_gc` from cron, or set INTERVAL
+# (seconds) to collect from a background thread in every process.
+ACCOUNTS_GC = {
+    'CHUNK_SIZE': 500,
+    'PAUSE': 0.0,
+    'INTERVAL': int(os.environ.get('ACCOUNTS_GC_INTERVAL', 0)),
+}
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
@@ -89,6 +223,44 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic writes content-hashed copies plus .gz (and .br with the
+# optional brotli package) siblings, so static files can be cached forever
+# and served without compressing per request. Set SERVE_STATIC=1 to let
+# Django serve STATIC_ROOT when no web server sits in front of it.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'accounts.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+SERVE_STATIC = os.environ.get('SERVE_STATIC', '') == '1'
+
+# Third-party files in accounts.assets.VENDOR_ASSETS are served from
+# static/vendor, which `python manage.py vendor_assets` fills. Set
+# VENDOR_ASSETS_CDN=1 to load files missing from there from their pinned
+# CDN URLs instead; pages carry the SRI hash either way.
+VENDOR_ASSETS_CDN = os.environ.get('VENDOR_ASSETS_CDN', '') == '1'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Avatars
+# Uploads over MAX_UPLOAD_SIZE bytes are dropped while streaming and images
+# over MAX_DIMENSION pixels a side are rejected from their header. Accepted
+# uploads are resized on a background thread pool (WORKERS) into square
+# WebP and JPEG thumbnails at SIZES, named by content hash; run
+# `python manage.py process_avatars` to finish uploads a restart left pending.
+AVATAR = {
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,
+    'MAX_DIMENSION': 4096,
+    'SIZES': {'small': 64, 'medium': 256},
+    'QUALITY': 82,
+    'BACKGROUND': True,
+    'WORKERS': 2,
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email Configuration for Password Reset
@@ -101,10 +273,134 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Console back
 # EMAIL_HOST_USER = 'your-email@gmail.com'
 # EMAIL_HOST_PASSWORD = 'your-app-password'
 
+DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_FROM', 'noreply@authsystem.com')
+
+# Outgoing mail is queued in EmailOutbox and delivered by
+# `python manage.py send_outbox --loop`. Failed sends are retried with
+# exponential backoff (RETRY_BASE_DELAY seconds, doubling) and dead-lettered
+# after MAX_ATTEMPTS.
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BASE_DELAY': 60,
+    'LEASE': 300,
+}
+
+# Anonymous home, login and register pages are served from a cached shell
+# with the visitor's CSRF token and messages filled in per request. Keys
+# carry VERSION (default: a digest of the template files), so a deploy
+# with changed templates starts fresh; `python manage.py clear_page_cache`
+# drops shells by hand.
+PAGE_CACHE = {
+    'ENABLED': os.environ.get('PAGE_CACHE', '' if DEBUG else '1') == '1',
+    'CACHE': 'default',
+    'TIMEOUT': 24 * 60 * 60,
+    'VERSION': os.environ.get('DEPLOY_VERSION'),
+}
+
+# Request metrics
+# Per-view wall, SQL, password hashing and template time plus cache hits
+# and misses, kept in memory by each process and served in the Prometheus
+# format at /metrics to ALLOWED_IPS, or to anyone sending TOKEN as a
+# bearer token. SERVER_TIMING adds the same breakdown to every response
+# for the browser's network panel; it reveals internals, so it is on in
+# development only by default.
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS', '') == '1',
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', '1' if DEBUG else '') == '1',
+    'ALLOWED_IPS': ('127.0.0.1', '::1'),
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# N+1 query detection
+# With ENABLED, a request that runs the same query shape more than
+# THRESHOLD times is logged with the view and template lines behind it and
+# appended to REPORT_PATH; RAISE makes the request, and so the test
+# driving it, fail. Summarise a run with `python manage.py query_report`.
+QUERY_AUDIT = {
+    'ENABLED': os.environ.get('QUERY_AUDIT', '') == '1',
+    'THRESHOLD': int(os.environ.get('QUERY_AUDIT_THRESHOLD', 5)),
+    'RAISE': os.environ.get('QUERY_AUDIT_RAISE', '') == '1',
+    'REPORT_PATH': os.environ.get('QUERY_AUDIT_REPORT', os.path.join(BASE_DIR, 'query_audit.jsonl')),
+}
+
 # Authentication settings
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'accounts:dashboard'
 LOGOUT_REDIRECT_URL = 'accounts:login'
 
+# Sessions
+# SESSION_BACKEND picks the engine: cached_db (default) reads sessions from
+# the cache and falls back to the database, cache keeps them only in the
+# cache (use a shared one, such as Redis or Memcached, with several
+# processes), signed_cookies keeps them in the browser with no server
+# state, and db is Django's plain database engine. Compare them with
+# `python manage.py benchmark_sessions`.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('SESSION_BACKEND', 'cached_db')]
+SESSION_CACHE_ALIAS = 'default'
+
+# Remember-me logins last SESSION_REMEMBER_ME_AGE seconds from the last
+# refresh. Instead of SESSION_SAVE_EVERY_REQUEST, SessionRefreshMiddleware
+# re-saves an active session at most every SESSION_REFRESH_INTERVAL seconds.
+SESSION_REMEMBER_ME_AGE = 30 * 24 * 60 * 60
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = int(os.environ.get('SESSION_REFRESH_INTERVAL', 300))
+
+# Account lockout
+# Failed logins within ACCOUNT_LOCKOUT_WINDOW (seconds or timedelta, 0 to
+# count until the next successful login) lock the account at the threshold.
+ACCOUNT_LOCKOUT_THRESHOLD = int(os.environ.get('ACCOUNT_LOCKOUT_THRESHOLD', 5))
+ACCOUNT_LOCKOUT_WINDOW = int(os.environ.get('ACCOUNT_LOCKOUT_WINDOW', 15 * 60))
+
+# Cache
+# Local memory is enough for a single process and for tests. Point this at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) in
+# production so every worker sees the same login throttle counters.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Login throttle
+# Failed logins are counted per client IP and per submitted username in a
+# sliding window (seconds). Over-limit clients are rejected before the
+# database or the password hasher is touched; UserProfile.is_locked remains
+# the durable fallback.
+LOGIN_THROTTLE_ENABLED = True
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_WINDOW = 15 * 60
+LOGIN_THROTTLE_IP_LIMIT = 20
+LOGIN_THROTTLE_USERNAME_LIMIT = ACCOUNT_LOCKOUT_THRESHOLD
+
+# Client address
+# Number of reverse proxies in front of the app that append to
+# X-Forwarded-For. With 0 the client address is REMOTE_ADDR; otherwise it is
+# the hop the outermost trusted proxy saw. Values further left are set by the
+# client and never used for throttling or last_login_ip.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# Role registry
+# UserRole rows are cached in each process and reloaded when the version
+# token in ROLE_REGISTRY_CACHE changes (checked at most every N seconds).
+ROLE_REGISTRY_CACHE = 'default'
+ROLE_REGISTRY_CHECK_INTERVAL = 5
+
 # Custom User Model (optional - using default User model with extended permissions)
 # AUTH_USER_MODEL = 'accounts.CustomUser'
+
+# Authentication backends
+# ResolvedUserBackend verifies the user instance already fetched by the login
+# form, so a login does not look the user up again. ModelBackend stays as the
+# fallback for username/password calls (admin login, change password).
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ResolvedUserBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
@@ -1,12 +1,26 @@
 """
 URL configuration for the project.
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
-from django.views.generic import TemplateView
+from django.urls import path, include, re_path
+
+from accounts.assets import serve_static
+from accounts.instrumentation import metrics_view
+from accounts.page_cache import shell_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls', namespace='accounts')),
-    path('', TemplateView.as_view(template_name='home.html'), name='home'),
+    path('metrics', metrics_view, name='metrics'),
+    path('', shell_view('home.html'), name='home'),
 ]
+
+# Uploaded media is served by the web server in production
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
@@ -0,0 +1,87 @@
+// Toggle password visibility
+function togglePassword() {
+    const passwordInput = document.getElementById('id_password');
+    const type = passwordInput.getAttribute('type') === 'password' ? 'text' : 'password';
+    passwordInput.setAttribute('type', type);
+}
+
+// Form validation
+const loginForm = document.getElementById('loginForm');
+const loginBtn = document.getElementById('loginBtn');
+
+loginForm.addEventListener('submit', function(e) {
+    let isValid = true;
+
+    // Validate username
+    const username = document.getElementById('id_username').value.trim();
+    if (!username) {
+        showError('username-error', 'Please enter your username or email');
+        isValid = false;
+    } else {
+        hideError('username-error');
+    }
+
+    // Validate password
+    const password = document.getElementById('id_password').value;
+    if (!password) {
+        showError('password-error', 'Please enter your password');
+        isValid = false;
+    } else if (password.length < 6) {
+        showError('password-error', 'Password must be at least 6 characters');
+        isValid = false;
+    } else {
+        hideError('password-error');
+    }
+
+    if (!isValid) {
+        e.preventDefault();
+    } else {
+        // Show loading state
+        loginBtn.disabled = true;
+        document.querySelector('.btn-text').textContent = 'Signing in...';
+    }
+});
+
+function showError(elementId, message) {
+    const errorElement = document.getElementById(elementId);
+    errorElement.textContent = message;
+    errorElement.classList.add('show');
+    const inputId = elementId.replace('-error', '');
+    document.getElementById('id_' + inputId).style.borderColor = '#dc3545';
+}
+
+function hideError(elementId) {
+    const errorElement = document.getElementById(elementId);
+    errorElement.classList.remove('show');
+    const inputId = elementId.replace('-error', '');
+    document.getElementById('id_' + inputId).style.borderColor = '#e0e0e0';
+}
+
+// Clear errors on input
+document.getElementById('id_username').addEventListener('focus', function() {
+    hideError('username-error');
+});
+
+document.getElementById('id_password').addEventListener('focus', function() {
+    hideError('password-error');
+});
+
+// Enter key to submit
+document.getElementById('id_password').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        loginForm.submit();
+    }
+});
+
+// Add visual feedback
+document.getElementById('id_username').addEventListener('input', function() {
+    if (this.value.trim()) {
+        this.style.borderColor = '#e0e0e0';
+    }
+});
+
+document.getElementById('id_password').addEventListener('input', function() {
+    if (this.value) {
+        this.style.borderColor = '#e0e0e0';
+    }
+});